@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "txt_to_epub", "ai_chunks")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Eviction goes down to this share of max_bytes, so it runs once per few
+# megabytes written instead of on every put once the cache is full.
+LOW_WATER_FRACTION = 0.9
+
+
+def chunk_key(chunk_text, model_name, system_instruction, generation_config):
+    """
+    Content address for one AI request: any change to the chunk, the model or
+    its configuration produces a different key.
+    """
+    h = hashlib.sha256()
+    header = json.dumps(
+        {"model": model_name, "system": system_instruction, "config": generation_config},
+        sort_keys=True, ensure_ascii=False,
+    )
+    h.update(header.encode("utf-8"))
+    h.update(b"\0")
+    h.update(chunk_text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class ChunkCache:
+    """
+    Persistent on-disk cache of AI-cleaned chunks with size-based LRU eviction.
+
+    Each entry is a UTF-8 file named after its key. The directory is scanned
+    once at startup into an in-memory index of (mtime, size) per key; reads
+    refresh an entry's time, and once the cache grows past max_bytes the
+    least recently used entries are removed until it is back under
+    LOW_WATER_FRACTION of it. Safe to use from worker threads.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.index = {key: [mtime, size] for key, mtime, size in self._entries()}
+        self.total_bytes = sum(size for _, size in self.index.values())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".txt")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".txt"):
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                yield name[:-4], st.st_mtime, st.st_size
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path) # Mark as recently used (for the next run's index)
+        except OSError:
+            with self.lock:
+                self.misses += 1
+                entry = self.index.pop(key, None) # Removed behind our back (e.g. by another process)
+                if entry:
+                    self.total_bytes -= entry[1]
+            return None
+        with self.lock:
+            self.hits += 1
+            entry = self.index.get(key)
+            if entry:
+                entry[0] = time.time()
+            else:
+                size = os.path.getsize(path)
+                self.index[key] = [time.time(), size]
+                self.total_bytes += size
+        return text
+
+    def put(self, key, text):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = text.encode("utf-8")
+        # Write to a temp file and rename so a crash never leaves a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self.lock:
+            previous = self.index.get(key)
+            if previous:
+                self.total_bytes -= previous[1] # Overwritten, not added
+            self.index[key] = [time.time(), len(data)]
+            self.total_bytes += len(data)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Called with the lock held; works from the index, without touching the disk except to delete.
+        low_water = self.max_bytes * LOW_WATER_FRACTION
+        for key, (_, size) in sorted(self.index.items(), key=lambda item: item[1][0]):
+            if self.total_bytes <= low_water:
+                break
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass # Already gone; still drop it from the index
+            except OSError:
+                continue
+            del self.index[key]
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def stats_line(self):
+        lookups = self.hits + self.misses
+        rate = (100.0 * self.hits / lookups) if lookups else 0.0
+        return (f"AI cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), "
+                f"{self.evictions} evicted, {self.total_bytes / (1024 * 1024):.1f} MB on disk")
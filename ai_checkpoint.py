@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+
+
+class ChunkJournal:
+    """
+    Append-only JSONL journal of AI chunks that finished successfully.
+
+    The first line records a fingerprint of the chunk plan (input text,
+    model and configuration). A journal whose fingerprint no longer matches
+    is discarded, so edits to the input never resurrect stale chunks. Each
+    finished chunk is appended and fsynced as soon as it completes, which
+    lets a later run resume after a crash or a failed chunk.
+    """
+
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.completed = {}
+        self.lock = threading.Lock()
+        self._file = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline() or "{}")
+                if header.get("fingerprint") != self.fingerprint:
+                    return
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break # Torn write from a crash; everything before it is still valid
+                    self.completed[entry["index"]] = entry["text"]
+        except (OSError, ValueError):
+            return
+
+    def _open(self):
+        if self._file is None:
+            # Rewrite what we resumed from, which also drops any torn trailing line.
+            self._file = open(self.path, "w", encoding="utf-8")
+            self._append({"fingerprint": self.fingerprint})
+            for index, text in sorted(self.completed.items()):
+                self._append({"index": index, "text": text})
+
+    def _append(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def record(self, index, text):
+        with self.lock:
+            self._open()
+            self._append({"index": index, "text": text})
+            self.completed[index] = text
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -1,38 +1,27 @@
-import google.generativeai as genai
+from ai_cache import chunk_key
+from ai_checkpoint import ChunkJournal
+from instrument import StageRecord
+from fused import fused_clean_and_merge
+from chunk_planner import estimate_tokens, join_chunk_outputs, plan_chunks, token_budget
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 이건 주석이지롱
 
 
+MODEL_NAME = "gemini-1.5-flash"
 
+GENERATION_CONFIG = {
+    "temperature": 0.2, # Low temperature for more deterministic/faithful cleanup
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 8192,
+    "response_mime_type": "text/plain",
+}
 
-def clean_text_with_ai(text, api_key, progress_callback=None):
-    """
-    Cleans text using Google Gemini API.
-    
-    Args:
-        text (str): Raw text content.
-        api_key (str): User's Gemini API Key.
-        progress_callback (func): Optional callback to report progress (0.0 to 1.0).
-        
-    Returns:
-        str: Cleaned and formatted text.
-    """
-    genai.configure(api_key=api_key)
-    
-    # Configuration
-    generation_config = {
-        "temperature": 0.2, # Low temperature for more deterministic/faithful cleanup
-        "top_p": 0.95,
-        "top_k": 64,
-        "max_output_tokens": 8192,
-        "response_mime_type": "text/plain",
-    }
-    
-    model = genai.GenerativeModel(
-        model_name="gemini-1.5-flash", 
-        generation_config=generation_config,
-        system_instruction="""You are an expert ebook editor. Your task is to clean raw text extracted from a file (e.g., PDF or OCR scan) for conversion into an EPUB.
+SYSTEM_INSTRUCTION = """You are an expert ebook editor. Your task is to clean raw text extracted from a file (e.g., PDF or OCR scan) for conversion into an EPUB.
         
 Instructions:
 1. **Remove Noise**: Identify and remove all page numbers, running headers (book titles, chapter titles repeated at top/bottom of pages), and footers.
@@ -45,71 +34,352 @@ Instructions:
 4. **Format Headers**: If you identify a structural chapter START (not a running header), format it as "## Chapter Name".
 5. **Output**: Return ONLY the cleaned text content. No markdown code blocks.
 """
+
+# Estimated input tokens per request chunk: most of max_output_tokens, since
+# the answer is about as long as the chunk (see chunk_planner).
+CHUNK_TOKENS = token_budget(GENERATION_CONFIG)
+
+# Tokens of the previous chunk repeated at the start of the next (0 = off)
+CHUNK_OVERLAP_TOKENS = 0
+
+# Scheduling defaults. Lower these for free-tier keys.
+MAX_CONCURRENCY = 4
+REQUESTS_PER_MINUTE = 60
+TOKENS_PER_MINUTE = 1_000_000
+MAX_RETRIES = 5
+
+# HTTP statuses worth retrying: rate limited or transient server trouble.
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class ConversionCancelled(Exception):
+    """
+    Raised when the cancel event is set while chunks are being cleaned.
+
+    Never turned into a heuristic fallback: callers that catch AI errors
+    re-raise it. Chunks finished before the cancel stay in the journal.
+    """
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_minute.
+
+    acquire() blocks until enough tokens are available, or raises
+    ConversionCancelled once cancel_event is set. Requests larger than the
+    bucket capacity are clamped so they can still go through.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1, cancel_event=None):
+        amount = min(amount, self.capacity)
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                raise ConversionCancelled("Cancelled")
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            if cancel_event is None:
+                time.sleep(wait)
+            else:
+                cancel_event.wait(wait)
+
+
+class RateLimiter:
+    """Combined requests-per-minute and tokens-per-minute limit."""
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, token_count, cancel_event=None):
+        if self.requests:
+            self.requests.acquire(1, cancel_event)
+        if self.tokens:
+            self.tokens.acquire(token_count, cancel_event)
+
+
+def build_model(api_key):
+    # Imported here: the client library takes about a second to import and
+    # is only needed when a real model is used.
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel(
+        model_name=MODEL_NAME,
+        generation_config=GENERATION_CONFIG,
+        system_instruction=SYSTEM_INSTRUCTION,
     )
-    
-    # Basic chunking strategy
-    # Gemini 1.5 Flash has a large context window (1M tokens), so we can theoretically pass the whole book.
-    # However, for safety and response time, let's chunk if it's massive, or just try sending it all if it's reasonable.
-    # For a typical book (100k words), 1.5 Flash can handle it in one go.
-    # Let's try a single pass first, but wrap in try/catch.
-    
+
+
+def _status_code(exc):
+    # google.api_core exceptions expose the HTTP status as .code;
+    # other clients tend to use status_code.
+    for attr in ("code", "status_code"):
+        code = getattr(exc, attr, None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_retryable(exc):
+    code = _status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    message = str(exc).lower()
+    return "429" in message or "resource exhausted" in message or "unavailable" in message
+
+
+def _generate_with_retry(model, chunk_text, limiter, max_retries, cancel_event=None):
+    attempt = 0
+    while True:
+        # Checked before every request; one already sent is allowed to finish
+        if cancel_event is not None and cancel_event.is_set():
+            raise ConversionCancelled("Cancelled")
+        limiter.acquire(estimate_tokens(chunk_text), cancel_event)
+        try:
+            response = model.generate_content(chunk_text)
+            return response.text
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            # Exponential backoff with jitter, capped at one minute
+            delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+            if cancel_event is None:
+                time.sleep(delay)
+            else:
+                cancel_event.wait(delay)
+            attempt += 1
+
+
+def _clean_chunk_cached(model, chunk_text, limiter, max_retries, cache, cancel_event=None):
+    if cache is None:
+        return _generate_with_retry(model, chunk_text, limiter, max_retries, cancel_event)
+
+    key = chunk_key(chunk_text, getattr(model, "model_name", MODEL_NAME), SYSTEM_INSTRUCTION, GENERATION_CONFIG)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    result = _generate_with_retry(model, chunk_text, limiter, max_retries, cancel_event)
+    cache.put(key, result)
+    return result
+
+
+def _clean_chunk(model, chunk_text, limiter, max_retries, cache, tracer, index, cancel_event=None):
+    if tracer is None:
+        return _clean_chunk_cached(model, chunk_text, limiter, max_retries, cache, cancel_event)
+
+    record = StageRecord(f"ai_chunk[{index}]", len(chunk_text))
+    wall_start = time.perf_counter()
+    cpu_start = time.thread_time()
     try:
+        result = _clean_chunk_cached(model, chunk_text, limiter, max_retries, cache, cancel_event)
+        record.output_size = len(result)
+        return result
+    finally:
+        record.wall = time.perf_counter() - wall_start
+        record.cpu = time.thread_time() - cpu_start
+        tracer.add(record)
+
+
+def heuristic_clean(chunk_text):
+    """Non-AI fallback for a single chunk."""
+    return fused_clean_and_merge(chunk_text)
+
+
+def clean_chunks_with_ai(chunks, model, progress_callback=None, max_concurrency=MAX_CONCURRENCY,
+                         limiter=None, max_retries=MAX_RETRIES, cache=None, completed=None,
+                         on_chunk_done=None, on_chunk_error=None, tracer=None, cancel_event=None,
+                         chunk_callback=None):
+    """
+    Sends chunks to the model concurrently and returns the results in input order.
+
+    Args:
+        chunks (list): Chunk texts.
+        model: Anything with generate_content(text) returning an object with .text.
+        progress_callback (func): Optional callback to report progress (0.0 to 1.0).
+        max_concurrency (int): Maximum number of requests in flight.
+        limiter (RateLimiter): Shared rate limiter. A default one is created if None.
+        max_retries (int): Retries per chunk on 429/5xx errors.
+        cache (ChunkCache): Optional on-disk cache; hits skip the API entirely.
+        completed (dict): Already finished chunks (index -> text), e.g. from a journal. These are not resent.
+        on_chunk_done (func): Optional callback(index, text) run as each chunk finishes.
+        on_chunk_error (func): Optional callback(index, exc) returning replacement text for a failed chunk.
+            Without it the first failure is raised.
+        tracer (Tracer): Optional tracer; each chunk request is recorded as "ai_chunk[i]".
+        cancel_event (threading.Event): Optional; once set, no further request is sent, queued
+            chunks are dropped and ConversionCancelled is raised. Requests in flight finish first.
+        chunk_callback (func): Optional callback(done, total) counting chunks, called once before
+            the first request (with the chunks already completed) and after every chunk.
+
+    Returns:
+        list: Cleaned text per chunk (None for blank chunks).
+    """
+    if limiter is None:
+        limiter = RateLimiter()
+
+    results = [None] * len(chunks)
+    total = len(chunks)
+    completed = completed or {}
+    for i, text in completed.items():
+        results[i] = text
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        futures = {
+            pool.submit(_clean_chunk, model, chunk_text, limiter, max_retries, cache, tracer, i, cancel_event): i
+            for i, chunk_text in enumerate(chunks)
+            if chunk_text.strip() and i not in completed
+        }
+        done = total - len(futures)
+        if chunk_callback:
+            chunk_callback(done, total)
+        try:
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except ConversionCancelled:
+                    raise
+                except Exception as e:
+                    if on_chunk_error is None:
+                        raise
+                    results[i] = on_chunk_error(i, e)
+                else:
+                    if on_chunk_done:
+                        on_chunk_done(i, results[i])
+                done += 1
+                if progress_callback:
+                    # Map progress from 0.2 to 0.9
+                    progress_callback(0.2 + (0.7 * done / total))
+                if chunk_callback:
+                    chunk_callback(done, total)
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ConversionCancelled("Cancelled")
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    return results
+
+
+def clean_planned_chunks(chunks, api_key, progress_callback=None, model=None, max_concurrency=MAX_CONCURRENCY,
+                         requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                         max_retries=MAX_RETRIES, cache=None, journal_path=None, log_callback=None, tracer=None,
+                         cancel_event=None, chunk_callback=None):
+    """
+    Cleans already planned chunks (see chunk_planner.plan_chunks) with the Gemini API.
+
+    This is clean_text_with_ai without the planning and reassembly, for
+    callers that pick the chunks themselves (e.g. hybrid mode). All chunks
+    share one rate limiter and worker pool. The arguments are the same as
+    clean_text_with_ai's.
+
+    Returns:
+        list: Cleaned text per chunk, in input order.
+    """
+    try:
+        if model is None:
+            model = build_model(api_key)
+
         if progress_callback:
             progress_callback(0.2)
-            
-      
-        chunk_size = 15000 
-        chunks = []
-        for i in range(0, len(text), chunk_size):
-            chunks.append(text[i:i + chunk_size])
-            
-        cleaned_chunks = []
-        total_chunks = len(chunks)
-        
-        for i, chunk in enumerate(chunks):
-            # Overlap context slightly? No, simple chunking for now to avoid duplication issues.
-            # Ideally we split on paragraph boundaries.
-            
-            # Refined split: find last newline
-            # (Skipping complex split logic for MVP, assuming simple char chunking is okay-ish 
-            # if we warn user, but let's try to be safer: split by \n)
-            pass 
-
-        # Better Splitting:
-        lines = text.splitlines()
-        current_chunk = []
-        current_length = 0
-        safe_chunks = []
-        
-        for line in lines:
-            if current_length + len(line) > 10000:
-                safe_chunks.append("\n".join(current_chunk))
-                current_chunk = []
-                current_length = 0
-            current_chunk.append(line)
-            current_length += len(line) + 1
-            
-        if current_chunk:
-            safe_chunks.append("\n".join(current_chunk))
-            
-        total_safe_chunks = len(safe_chunks)
-        
-        for i, chunk_text in enumerate(safe_chunks):
-            if not chunk_text.strip():
-                continue
-                
-            response = model.generate_content(chunk_text)
-            cleaned_chunks.append(response.text)
-            
-            if progress_callback:
-                # Map progress from 0.2 to 0.9
-                prog = 0.2 + (0.7 * (i + 1) / total_safe_chunks)
-                progress_callback(prog)
-                
-            # Rate limit guard
-            time.sleep(1) 
-
-        return "\n\n".join(cleaned_chunks)
 
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+
+        # A failed chunk falls back to the heuristic cleaner on its own, with or
+        # without a journal; the journal only decides whether progress is kept.
+        failed = []
+
+        def on_chunk_error(i, e):
+            failed.append(i)
+            if log_callback:
+                log_callback(f"Chunk {i + 1}/{len(chunks)} failed ({e}); using standard cleaning for it.")
+            return heuristic_clean(chunks[i])
+
+        journal = None
+        completed = None
+        on_chunk_done = None
+        if journal_path:
+            model_name = getattr(model, "model_name", MODEL_NAME)
+            fingerprint = chunk_key("\x1e".join(chunks), model_name, SYSTEM_INSTRUCTION, GENERATION_CONFIG)
+            journal = ChunkJournal(journal_path, fingerprint)
+            completed = dict(journal.completed)
+            on_chunk_done = journal.record
+            if completed and log_callback:
+                log_callback(f"Resuming AI cleaning: {len(completed)}/{len(chunks)} chunks already done.")
+
+        try:
+            cleaned_chunks = clean_chunks_with_ai(
+                chunks, model, progress_callback, max_concurrency, limiter, max_retries, cache,
+                completed, on_chunk_done, on_chunk_error, tracer, cancel_event, chunk_callback
+            )
+        finally:
+            if journal:
+                journal.close()
+
+        if failed and log_callback:
+            retry = "run again to retry them with AI" if journal else "the other chunks were cleaned with AI"
+            log_callback(f"{len(failed)} chunk(s) used standard cleaning; {retry}.")
+        if journal and not failed:
+            journal.discard()
+
+        return cleaned_chunks
+
+    except ConversionCancelled:
+        if log_callback and journal_path:
+            log_callback("AI cleaning cancelled; finished chunks are kept for the next run.")
+        raise
     except Exception as e:
         raise Exception(f"AI Processing Error: {str(e)}")
+
+
+def clean_text_with_ai(text, api_key, progress_callback=None, model=None, max_concurrency=MAX_CONCURRENCY,
+                       requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE,
+                       max_retries=MAX_RETRIES, cache=None, journal_path=None, log_callback=None,
+                       tracer=None, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                       cancel_event=None, chunk_callback=None):
+    """
+    Cleans text using Google Gemini API.
+    
+    Args:
+        text (str): Raw text content.
+        api_key (str): User's Gemini API Key.
+        progress_callback (func): Optional callback to report progress (0.0 to 1.0).
+        model: Optional model client. Defaults to genai.GenerativeModel; pass a fake to run offline.
+        max_concurrency (int): Maximum number of requests in flight.
+        requests_per_minute (int): Request rate limit (0 disables).
+        tokens_per_minute (int): Estimated input token rate limit (0 disables).
+        max_retries (int): Retries per chunk on 429/5xx errors, with exponential backoff.
+        cache (ChunkCache): Optional on-disk cache of cleaned chunks.
+        journal_path (str): Optional checkpoint journal. Finished chunks are recorded as they complete
+            and a later run on the same input resumes from the chunks that are still missing.
+        log_callback (func): Optional callback for status messages.
+        tracer (Tracer): Optional tracer recording per-chunk timings.
+        chunk_tokens (int): Estimated token budget per request (see chunk_planner.plan_chunks).
+        overlap_tokens (int): Context repeated from the previous chunk; duplicates are dropped on reassembly.
+        cancel_event (threading.Event): Optional; setting it stops sending chunks and raises ConversionCancelled.
+        chunk_callback (func): Optional callback(done, total) counting finished chunks, e.g. for an ETA.
+        
+    Returns:
+        str: Cleaned and formatted text.
+    """
+    chunks = plan_chunks(text, chunk_tokens, overlap_tokens)
+    if log_callback:
+        log_callback(f"Planned {len(chunks)} request(s) of up to ~{chunk_tokens:,} tokens.")
+
+    cleaned_chunks = clean_planned_chunks(
+        chunks, api_key, progress_callback, model, max_concurrency, requests_per_minute, tokens_per_minute,
+        max_retries, cache, journal_path, log_callback, tracer, cancel_event, chunk_callback
+    )
+    return join_chunk_outputs(cleaned_chunks, overlap=overlap_tokens > 0)
@@ -0,0 +1,229 @@
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from epub_writer import DEFAULT_COMPRESSION_LEVEL, DEFAULT_WRITER, WRITERS
+from pipeline import convert_file, default_output_path
+
+
+class BatchResult:
+    """Outcome of converting one file in a batch."""
+
+    def __init__(self, input_path, output_path=None, error=None, seconds=0.0):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.error = error
+        self.seconds = seconds
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def expand_inputs(patterns, recursive=False):
+    """
+    Expands files, directories and glob patterns into a sorted list of .txt files.
+
+    Args:
+        patterns (list): Paths, directories or glob patterns.
+        recursive (bool): Descend into subdirectories of directory arguments.
+
+    Returns:
+        list: Unique input file paths.
+    """
+    found = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            sub = os.path.join("**", "*.txt") if recursive else "*.txt"
+            found.extend(p for p in glob.glob(os.path.join(pattern, sub), recursive=recursive) if os.path.isfile(p))
+        elif os.path.isfile(pattern):
+            found.append(pattern)
+        else:
+            found.extend(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+
+    seen = set()
+    unique = []
+    for path in sorted(found):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+
+def plan_output_paths(input_paths, output_dir=None):
+    """
+    Decides where each input's EPUB goes, and which inputs would overwrite each other.
+
+    With output_dir, each input's path relative to the inputs' common
+    directory is mirrored under output_dir, so in/a/book.txt and
+    in/b/book.txt become out/a/book.epub and out/b/book.epub instead of
+    both landing on out/book.epub.
+
+    Args:
+        input_paths (list): Files to convert.
+        output_dir (str): Optional directory for the EPUBs. Defaults to next to each input.
+
+    Returns:
+        tuple: (dict of input path -> output path,
+                dict of input path -> error for inputs that share an output path)
+    """
+    root = None
+    if output_dir and input_paths:
+        try:
+            root = os.path.commonpath([os.path.dirname(os.path.abspath(p)) for p in input_paths])
+        except ValueError:
+            root = None # Inputs on different drives; fall back to flat names
+
+    outputs = {}
+    for path in input_paths:
+        if root is None:
+            outputs[path] = default_output_path(path, output_dir)
+        else:
+            relative = os.path.relpath(os.path.abspath(path), root)
+            outputs[path] = os.path.join(output_dir, os.path.splitext(relative)[0] + ".epub")
+
+    # Two inputs can still map to one file (e.g. book.txt and book.TXT, or
+    # book.txt next to book.text); fail all of them rather than let them race.
+    by_output = {}
+    for path, output_path in outputs.items():
+        by_output.setdefault(os.path.normcase(os.path.abspath(output_path)), []).append(path)
+    collisions = {}
+    for paths in by_output.values():
+        if len(paths) > 1:
+            for path in paths:
+                others = ", ".join(p for p in paths if p != path)
+                collisions[path] = f"Output path {outputs[path]} is also the output of {others}"
+    return outputs, collisions
+
+
+def _convert_one(input_path, output_path, author, streaming=False, incremental=False, periodic_headers=False,
+                 writer=DEFAULT_WRITER, compression_level=DEFAULT_COMPRESSION_LEVEL, cleaning_workers=None):
+    # Runs inside a worker process. Exceptions are turned into results so
+    # one bad file never takes down the rest of the batch.
+    start = time.perf_counter()
+    try:
+        written = convert_file(input_path, output_path, author=author, streaming=streaming, incremental=incremental,
+                               periodic_headers=periodic_headers, writer=writer, compression_level=compression_level,
+                               cleaning_workers=cleaning_workers)
+        return BatchResult(input_path, written, seconds=time.perf_counter() - start)
+    except Exception as e:
+        return BatchResult(input_path, error=f"{type(e).__name__}: {e}", seconds=time.perf_counter() - start)
+
+
+def run_batch(input_paths, output_dir=None, author=None, workers=None, on_result=None, streaming=False,
+              incremental=False, periodic_headers=False, writer=DEFAULT_WRITER,
+              compression_level=DEFAULT_COMPRESSION_LEVEL, cleaning_workers=None):
+    """
+    Converts many files across a process pool.
+
+    Args:
+        input_paths (list): Files to convert.
+        output_dir (str): Optional directory for the EPUBs, mirroring the inputs' relative
+            paths (see plan_output_paths). Defaults to next to each input.
+        author (str): Optional author applied to every book.
+        workers (int): Pool size. Defaults to the CPU count.
+        on_result (func): Optional callback invoked with each BatchResult as it finishes.
+        streaming (bool): Use the bounded-memory streaming pipeline for every file.
+        incremental (bool): Only rebuild chapters that changed since the previous run.
+        periodic_headers (bool): Also remove headers found by their period (see header_detector).
+        writer (str): EPUB writer, one of epub_writer.WRITERS.
+        compression_level (int): zlib level 0-9 for the native writer.
+        cleaning_workers (int): Processes cleaning each single file (see parallel.py). Meant for a
+            few very large files with workers=1, since every file then starts its own pool.
+
+    Returns:
+        list: BatchResult for every input, in input order.
+    """
+    outputs, collisions = plan_output_paths(input_paths, output_dir)
+    if output_dir:
+        for directory in {os.path.dirname(output_path) for output_path in outputs.values()}:
+            os.makedirs(directory, exist_ok=True)
+
+    results = {}
+    for path, error in collisions.items():
+        results[path] = BatchResult(path, error=error)
+        if on_result:
+            on_result(results[path])
+    pending = [path for path in input_paths if path not in collisions]
+
+    if workers == 1:
+        # Run in-process; handy for debugging and for tiny batches.
+        for path in pending:
+            result = _convert_one(path, outputs[path], author, streaming, incremental,
+                                  periodic_headers, writer, compression_level, cleaning_workers)
+            results[path] = result
+            if on_result:
+                on_result(result)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(_convert_one, path, outputs[path], author, streaming, incremental,
+                            periodic_headers, writer, compression_level, cleaning_workers): path
+                for path in pending
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    # The worker itself died (e.g. killed by the OS).
+                    result = BatchResult(path, error=f"{type(e).__name__}: {e}")
+                results[path] = result
+                if on_result:
+                    on_result(result)
+
+    return [results[path] for path in input_paths]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert text files to EPUB without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="Input .txt files, directories or glob patterns")
+    parser.add_argument("-o", "--output-dir", help="Directory for the generated EPUBs, mirroring the input folders (default: next to each input)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="Search directories recursively")
+    parser.add_argument("--author", help="Author name for every book (default: Unknown)")
+    parser.add_argument("--streaming", action="store_true", help="Bounded-memory mode for very large inputs")
+    parser.add_argument("--incremental", action="store_true", help="Only rebuild chapters that changed since the last run")
+    parser.add_argument("--periodic-headers", action="store_true",
+                        help="Also remove running headers found by how regularly they repeat (works without page numbers)")
+    parser.add_argument("--writer", choices=WRITERS, default=DEFAULT_WRITER,
+                        help="EPUB writer; 'native' streams chapters into the zip without ebooklib")
+    parser.add_argument("--compression-level", type=int, choices=range(10), default=DEFAULT_COMPRESSION_LEVEL,
+                        metavar="0-9", help="zlib level for the native writer (1 fastest, 9 smallest)")
+    parser.add_argument("--cleaning-workers", type=int, default=None, metavar="N",
+                        help="Clean each file across N processes (for very large files, use with -j 1)")
+    args = parser.parse_args(argv)
+
+    input_paths = expand_inputs(args.inputs, recursive=args.recursive)
+    if not input_paths:
+        print("No input files found.", file=sys.stderr)
+        return 2
+
+    def report(result):
+        if result.ok:
+            print(f"OK    {result.input_path} -> {result.output_path} ({result.seconds:.2f}s)")
+        else:
+            print(f"FAIL  {result.input_path}: {result.error}", file=sys.stderr)
+
+    start = time.perf_counter()
+    results = run_batch(input_paths, args.output_dir, args.author, args.workers, on_result=report, streaming=args.streaming,
+                        incremental=args.incremental, periodic_headers=args.periodic_headers, writer=args.writer,
+                        compression_level=args.compression_level, cleaning_workers=args.cleaning_workers)
+    elapsed = time.perf_counter() - start
+
+    failed = [r for r in results if not r.ok]
+    rate = len(results) / elapsed if elapsed > 0 else 0.0
+    print(f"\nConverted {len(results) - len(failed)}/{len(results)} files in {elapsed:.2f}s ({rate:.2f} files/sec)")
+    if failed:
+        print(f"{len(failed)} failed:", file=sys.stderr)
+        for r in failed:
+            print(f"  {r.input_path}: {r.error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
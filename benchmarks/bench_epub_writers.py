@@ -0,0 +1,156 @@
+"""
+Compares the EPUB writers: ebooklib assembly vs. the native streaming zip writer.
+
+    python -m benchmarks.bench_epub_writers --size-mb 20
+    python -m benchmarks.bench_epub_writers --size-mb 20 --level 1 --level 6 --level 9
+
+The synthetic book is cleaned once and saved one paragraph per line; each
+writer then runs in a fresh interpreter and reads the paragraphs lazily,
+as convert_file feeds them, so the book itself is never in memory there.
+Memory is reported twice: the Python heap (tracemalloc) and the growth of
+the process's peak RSS while writing, which also counts what lxml
+allocates outside Python.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.bench_pipeline import _git_commit
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _iter_paragraphs(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield line.rstrip("\n")
+
+
+def measure_writer(writer, level, paragraphs_path):
+    """Runs one writer in this process and returns its measurements."""
+    from epub_writer import create_epub
+
+    output_path = os.path.join(tempfile.mkdtemp(prefix="bench_writer_"), "book.epub")
+
+    # Import the writer's dependencies before the clock starts
+    create_epub(["Warmup"], output_path, "Warmup", "Bench", writer=writer, compression_level=level)
+
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    create_epub(_iter_paragraphs(paragraphs_path), output_path, "Benchmark", "Bench", writer=writer,
+                compression_level=level)
+    seconds = time.perf_counter() - start
+    rss_after = _peak_rss_mb()
+
+    tracemalloc.start()
+    create_epub(_iter_paragraphs(paragraphs_path), output_path, "Benchmark", "Bench", writer=writer,
+                compression_level=level)
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "seconds": round(seconds, 4),
+        "heap_peak_mb": round(heap_peak / (1024 * 1024), 2),
+        "rss_growth_mb": round(rss_after - rss_before, 2) if rss_before is not None else None,
+        "epub_mb": round(os.path.getsize(output_path) / (1024 * 1024), 3),
+    }
+
+
+def write_paragraphs(path, size_mb, seed, language):
+    """Generates and cleans the synthetic book, saving one paragraph per line."""
+    from benchmarks.synthetic import generate_book
+    from fused import iter_fused_paragraphs
+
+    book = generate_book(int(size_mb * 1024 * 1024), seed=seed, language=language)
+    with open(path, "w", encoding="utf-8") as f:
+        for paragraph in iter_fused_paragraphs(book.text.splitlines()):
+            f.write(paragraph.replace("\n", " ") + "\n")
+
+
+def _run_module(*args):
+    completed = subprocess.run([sys.executable, "-m", "benchmarks.bench_epub_writers", *args],
+                               capture_output=True, text=True, check=True)
+    return completed.stdout
+
+
+def run(size_mb=20.0, seed=0, language="mixed", levels=(6,)):
+    # Generated in its own process too: a child started from a process that once
+    # held the whole book can report that process's peak RSS as its own.
+    fd, paragraphs_path = tempfile.mkstemp(prefix="bench_writer_", suffix=".txt")
+    os.close(fd)
+    _run_module("--prepare", paragraphs_path, "--size-mb", str(size_mb), "--seed", str(seed), "--language", language)
+
+    configurations = [("ebooklib", levels[0])] + [("native", level) for level in levels]
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"size_mb": size_mb, "seed": seed, "language": language, "levels": list(levels)},
+        "writers": {},
+    }
+    for writer, level in configurations:
+        # ebooklib always compresses at zlib's default; the level only matters for the native writer
+        name = writer if writer == "ebooklib" else f"native (level {level})"
+        output = _run_module("--worker", writer, str(level), paragraphs_path)
+        results["writers"][name] = json.loads(output.strip().splitlines()[-1])
+    os.remove(paragraphs_path)
+    return results
+
+
+def print_results(results):
+    print(f"input: {results['params']['size_mb']} MB  commit: {results['commit']}  python: {results['python']}")
+    print(f"{'writer':<20}{'seconds':>10}{'heap MB':>10}{'RSS +MB':>10}{'EPUB MB':>10}")
+    for name, r in results["writers"].items():
+        rss = f"{r['rss_growth_mb']:.1f}" if r["rss_growth_mb"] is not None else "n/a"
+        print(f"{name:<20}{r['seconds']:>10.3f}{r['heap_peak_mb']:>10.1f}{rss:>10}{r['epub_mb']:>10.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the ebooklib and native EPUB writers.")
+    parser.add_argument("--size-mb", type=float, default=20.0, help="Synthetic book size (default: 20)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--language", choices=("english", "korean", "mixed"), default="mixed")
+    parser.add_argument("--level", type=int, action="append", choices=range(10), metavar="0-9",
+                        help="Compression level for the native writer (repeatable, default: 6)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--prepare", metavar="PARAGRAPHS", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", nargs=3, metavar=("WRITER", "LEVEL", "PARAGRAPHS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.prepare:
+        write_paragraphs(args.prepare, args.size_mb, args.seed, args.language)
+        return 0
+    if args.worker:
+        writer, level, paragraphs_path = args.worker
+        print(json.dumps(measure_writer(writer, int(level), paragraphs_path)))
+        return 0
+
+    results = run(args.size_mb, args.seed, args.language, args.level or [6])
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
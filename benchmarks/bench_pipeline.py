@@ -0,0 +1,159 @@
+"""
+Throughput benchmark for the cleaning/merging pipeline.
+
+    python -m benchmarks.bench_pipeline --size-mb 5 --output bench_results.json
+    python -m benchmarks.bench_pipeline --size-mb 5 --compare bench_results.json
+
+Runs fully offline: the AI stage uses benchmarks.fake_model.FakeModel.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from ai_cleaner import CHUNK_TOKENS, clean_planned_chunks, clean_text_with_ai
+from cleaner import clean_structure, sophisticated_clean
+from epub_writer import create_epub
+from merger import merge_paragraphs
+from fused import fused_clean_and_merge
+from parallel import parallel_clean_and_merge
+from hybrid import clean_text_hybrid
+from benchmarks.fake_model import FakeModel
+from benchmarks.synthetic import generate_book
+
+
+def _stages(book, ai_latency):
+    """Returns (name, function, input) per stage. Each function takes its input and returns its output."""
+    cleaned = clean_structure(book.text)
+    merged = merge_paragraphs(cleaned)
+    out_dir = tempfile.mkdtemp(prefix="bench_epub_")
+
+    def run_create_epub(text):
+        create_epub(text, os.path.join(out_dir, "bench.epub"), "Benchmark", "Bench")
+
+    def run_ai(text):
+        return clean_text_with_ai(text, None, model=FakeModel(latency=ai_latency),
+                                  requests_per_minute=0, tokens_per_minute=0)
+
+    def run_hybrid(text):
+        def clean_chunks(chunks):
+            return clean_planned_chunks(chunks, None, model=FakeModel(latency=ai_latency),
+                                        requests_per_minute=0, tokens_per_minute=0)
+        return clean_text_hybrid(text, clean_chunks, CHUNK_TOKENS)
+
+    return [
+        ("clean_structure", clean_structure, book.text),
+        ("sophisticated_clean", lambda text: sophisticated_clean(text, book.chapter_titles + book.running_headers), book.text),
+        ("merge_paragraphs", merge_paragraphs, cleaned),
+        # The two stages back to back vs. the single-pass engine with the same output
+        ("clean_and_merge", lambda text: merge_paragraphs(clean_structure(text)), book.text),
+        ("fused", fused_clean_and_merge, book.text),
+        ("fused_periodic", lambda text: fused_clean_and_merge(text, periodic_headers=True), book.text),
+        # Same output again, split across a process pool (in-process below parallel.MIN_PARALLEL_CHARS)
+        ("parallel", parallel_clean_and_merge, book.text),
+        ("create_epub", run_create_epub, merged),
+        ("ai_fake", run_ai, book.text),
+        ("ai_hybrid_fake", run_hybrid, book.text),
+    ]
+
+
+def measure(func, arg, repeat):
+    """
+    Best wall time over repeat runs, then one extra run under tracemalloc for peak memory.
+    (tracemalloc slows Python down, so it is kept out of the timed runs.)
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    tracemalloc.start()
+    func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(size_mb=2.0, seed=0, language="mixed", blank_lines=True, repeat=3, ai_latency=0.0, only=None):
+    book = generate_book(int(size_mb * 1024 * 1024), seed=seed, language=language, blank_lines=blank_lines)
+    input_mb = len(book.text.encode("utf-8")) / (1024 * 1024)
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"size_mb": size_mb, "seed": seed, "language": language, "blank_lines": blank_lines,
+                   "repeat": repeat, "ai_latency": ai_latency},
+        "input_mb": round(input_mb, 3),
+        "stages": {},
+    }
+
+    for name, func, arg in _stages(book, ai_latency):
+        if only and name not in only:
+            continue
+        stage_mb = len(arg.encode("utf-8")) / (1024 * 1024)
+        seconds, peak = measure(func, arg, repeat)
+        results["stages"][name] = {
+            "seconds": round(seconds, 4),
+            "mb_per_s": round(stage_mb / seconds, 3) if seconds else None,
+            "peak_mb": round(peak / (1024 * 1024), 2),
+        }
+    return results
+
+
+def print_results(results, baseline=None):
+    print(f"input: {results['input_mb']:.2f} MB  commit: {results['commit']}  python: {results['python']}")
+    print(f"{'stage':<22}{'seconds':>10}{'MB/s':>10}{'peak MB':>10}{'vs base':>10}")
+    for name, stage in results["stages"].items():
+        ratio = ""
+        if baseline and name in baseline.get("stages", {}):
+            base = baseline["stages"][name]["seconds"]
+            ratio = f"{base / stage['seconds']:.2f}x" if stage["seconds"] else ""
+        print(f"{name:<22}{stage['seconds']:>10.3f}{stage['mb_per_s'] or 0:>10.2f}{stage['peak_mb']:>10.1f}{ratio:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the cleaning/merging pipeline on a synthetic book.")
+    parser.add_argument("--size-mb", type=float, default=2.0, help="Synthetic book size (default: 2)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--language", choices=("english", "korean", "mixed"), default="mixed")
+    parser.add_argument("--no-blank-lines", action="store_true", help="Generate a book without blank lines between paragraphs")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage; the best is reported")
+    parser.add_argument("--ai-latency", type=float, default=0.0, help="Simulated seconds per fake AI request")
+    parser.add_argument("--stage", action="append", help="Only run this stage (repeatable)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    results = run(args.size_mb, args.seed, args.language, not args.no_blank_lines, args.repeat,
+                  args.ai_latency, args.stage)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
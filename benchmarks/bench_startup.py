@@ -0,0 +1,137 @@
+"""
+Startup-time benchmark: how long a fresh interpreter takes to import each
+entry point, and to convert a small book end to end.
+
+    python -m benchmarks.bench_startup --output startup.json
+    python -m benchmarks.bench_startup --compare startup.json
+
+Batch and daemon workers start fresh interpreters, so on small files the
+import cost is most of the conversion time. Each scenario also lists which
+heavy optional libraries it ended up importing.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_pipeline import _git_commit
+from benchmarks.synthetic import generate_book
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that should only be imported when their feature is used
+HEAVY_MODULES = ("customtkinter", "tkinter", "ebooklib", "lxml", "google.generativeai")
+
+# Printed by every scenario so the parent can see what got imported
+_REPORT = (
+    "import sys, json; "
+    f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+)
+
+
+def _scenarios(book_path, out_dir):
+    """Returns (name, python code) per scenario."""
+    return [
+        ("python", "pass"),
+        ("import pipeline", "import pipeline"),
+        ("import batch", "import batch"),
+        ("import daemon", "import daemon"),
+        ("import ai_cleaner", "import ai_cleaner"),
+        ("import hybrid", "import hybrid"),
+        ("import main", "import main"),
+        ("convert_file", f"from pipeline import convert_file; "
+                         f"convert_file({book_path!r}, {os.path.join(out_dir, 'small.epub')!r})"),
+        ("convert_file streaming", f"from pipeline import convert_file; "
+                                   f"convert_file({book_path!r}, {os.path.join(out_dir, 'small_s.epub')!r}, "
+                                   f"streaming=True)"),
+    ]
+
+
+def time_scenario(code, repeat):
+    """
+    Runs code in repeat fresh interpreters.
+
+    Returns:
+        tuple: (median seconds, best seconds, list of heavy modules imported)
+    """
+    times = []
+    loaded = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", f"{code}\n{_REPORT}"], cwd=REPO_ROOT,
+                                capture_output=True, text=True)
+        times.append(time.perf_counter() - start)
+        if result.returncode != 0:
+            raise RuntimeError(f"{code!r} failed:\n{result.stderr}")
+        loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return statistics.median(times), min(times), loaded
+
+
+def run(repeat=10, size_kb=20, only=None):
+    out_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    book_path = os.path.join(out_dir, "small.txt")
+    with open(book_path, "w", encoding="utf-8") as f:
+        f.write(generate_book(size_kb * 1024, seed=0).text)
+
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"repeat": repeat, "size_kb": size_kb},
+        "scenarios": {},
+    }
+    for name, code in _scenarios(book_path, out_dir):
+        if only and name not in only:
+            continue
+        median, best, loaded = time_scenario(code, repeat)
+        results["scenarios"][name] = {
+            "median_ms": round(median * 1000, 1),
+            "best_ms": round(best * 1000, 1),
+            "heavy_imports": loaded,
+        }
+    return results
+
+
+def print_results(results, baseline=None):
+    print(f"commit: {results['commit']}  python: {results['python']}  runs: {results['params']['repeat']}")
+    print(f"{'scenario':<24}{'median ms':>11}{'best ms':>10}{'vs base':>10}  heavy imports")
+    for name, scenario in results["scenarios"].items():
+        ratio = ""
+        if baseline and name in baseline.get("scenarios", {}):
+            base = baseline["scenarios"][name]["median_ms"]
+            ratio = f"{base / scenario['median_ms']:.2f}x" if scenario["median_ms"] else ""
+        heavy = ", ".join(scenario["heavy_imports"]) or "-"
+        print(f"{name:<24}{scenario['median_ms']:>11.1f}{scenario['best_ms']:>10.1f}{ratio:>10}  {heavy}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark interpreter startup and import time of each entry point.")
+    parser.add_argument("--repeat", type=int, default=10, help="Fresh interpreters per scenario; the median is reported")
+    parser.add_argument("--size-kb", type=int, default=20, help="Size of the small book converted end to end")
+    parser.add_argument("--scenario", action="append", help="Only run this scenario (repeatable)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON from an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat, args.size_kb, args.scenario)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
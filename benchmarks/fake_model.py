@@ -0,0 +1,33 @@
+import threading
+import time
+from cleaner import clean_structure
+from merger import merge_paragraphs
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """
+    Offline stand-in for genai.GenerativeModel.
+
+    generate_content() sleeps for a simulated network latency and returns the
+    heuristic cleaner's output, so AI-stage benchmarks exercise chunking,
+    scheduling and reassembly without an API key.
+    """
+
+    model_name = "fake-model"
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def generate_content(self, text):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return FakeResponse(merge_paragraphs(clean_structure(text)))
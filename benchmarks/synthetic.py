@@ -0,0 +1,107 @@
+import random
+import textwrap
+
+ENGLISH_WORDS = (
+    "the quick brown fox jumps over a lazy dog while old river stones keep their quiet "
+    "counsel and the village lamps flicker one by one across the valley under winter stars"
+).split()
+
+KOREAN_WORDS = (
+    "그리고 나는 오래된 집으로 돌아갔다 강물은 조용히 흘렀고 마을의 불빛이 하나둘 꺼졌다 "
+    "겨울 하늘 아래 바람이 불었다 우리는 말없이 걸었다"
+).split()
+
+CJK_WORDS = "山 水 風 月 花 鳥 雪 夜 春 秋 東 西 南 北 人 心".split()
+
+
+class SyntheticBook:
+    """A generated book plus the facts a benchmark needs about it."""
+
+    def __init__(self, text, chapter_titles, running_headers, pages):
+        self.text = text
+        self.chapter_titles = chapter_titles
+        self.running_headers = running_headers
+        self.pages = pages
+
+
+def _sentence(rng, language):
+    if language == "korean" or (language == "mixed" and rng.random() < 0.35):
+        words = [rng.choice(KOREAN_WORDS) for _ in range(rng.randint(3, 10))]
+        return " ".join(words) + rng.choice((".", ".", "!", "?"))
+    if language == "mixed" and rng.random() < 0.05:
+        return "".join(rng.choice(CJK_WORDS) for _ in range(rng.randint(4, 12))) + "。"
+    words = [rng.choice(ENGLISH_WORDS) for _ in range(rng.randint(5, 18))]
+    words[0] = words[0].capitalize()
+    sentence = " ".join(words) + rng.choice((".", ".", ".", "!", "?"))
+    if rng.random() < 0.1:
+        sentence = '"' + sentence + '"'
+    return sentence
+
+
+def generate_book(size_bytes, seed=0, language="mixed", blank_lines=True, lines_per_page=32,
+                  wrap_width=68, chapter_every_pages=12, book_title="The Fox and Hound"):
+    """
+    Generates a deterministic book-like text of roughly size_bytes (UTF-8).
+
+    The output has the artifacts of text extracted from a scanned or PDF book:
+    page numbers in several styles, alternating running headers (book title on
+    even pages, chapter title on odd pages), hard-wrapped lines, Korean/CJK
+    text and chapter markers.
+
+    Args:
+        size_bytes (int): Target size in bytes.
+        seed (int): Random seed; the same arguments always produce the same text.
+        language (str): "english", "korean" or "mixed".
+        blank_lines (bool): Separate paragraphs with blank lines (False exercises the no-blank-line merger path).
+        lines_per_page (int): Body lines per page.
+        wrap_width (int): Hard wrap column.
+        chapter_every_pages (int): Pages per chapter.
+        book_title (str): Used for the running header.
+
+    Returns:
+        SyntheticBook
+    """
+    rng = random.Random(seed)
+    lines = []
+    chapter_titles = []
+    size = 0
+    page = 1
+    chapter_title = None
+
+    while size < size_bytes:
+        page_lines = []
+        if (page - 1) % chapter_every_pages == 0:
+            number = len(chapter_titles) + 1
+            if language == "korean" or (language == "mixed" and number % 2 == 0):
+                chapter_title = f"제{number}장"
+            else:
+                chapter_title = f"Chapter {number}"
+            chapter_titles.append(chapter_title)
+            page_lines.append(chapter_title)
+            if blank_lines:
+                page_lines.append("")
+        elif page % 2 == 0:
+            page_lines.append(book_title)
+        else:
+            page_lines.append(chapter_title)
+
+        while len(page_lines) < lines_per_page:
+            paragraph = " ".join(_sentence(rng, language) for _ in range(rng.randint(1, 5)))
+            page_lines.extend(textwrap.wrap(paragraph, wrap_width) or [paragraph])
+            if blank_lines:
+                page_lines.append("")
+
+        style = page % 3
+        if style == 0:
+            page_lines.append(str(page))
+        elif style == 1:
+            page_lines.append(f"- {page} -")
+        else:
+            page_lines.append(f"[{page}]")
+
+        for line in page_lines:
+            size += len(line.encode("utf-8")) + 1
+        lines.extend(page_lines)
+        page += 1
+
+    return SyntheticBook("\n".join(lines), chapter_titles, [book_title], page - 1)
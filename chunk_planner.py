@@ -0,0 +1,205 @@
+import re
+from cleaner import PAGE_NUM_PATTERN
+
+# Share of max_output_tokens a chunk may fill. The cleaned text is about as
+# long as its input, plus "## " chapter markers, and the token estimate is
+# only approximate, so some headroom keeps the answer from being cut off.
+OUTPUT_BUDGET_RATIO = 0.85
+
+# Where an oversized single line may be cut: after sentence-ending punctuation
+SENTENCE_END_PATTERN = re.compile(r'(?<=[.!?。！？"”’])\s+')
+
+# Reassembly with overlap: how many paragraphs are compared on each side of
+# a chunk boundary, and the shortest paragraph that can mark a repeat.
+OVERLAP_LOOKBACK = 50
+MIN_FRAGMENT_LENGTH = 20
+
+
+def estimate_tokens(text):
+    """
+    Rough token count without a tokenizer: ~4 ASCII characters per token,
+    and roughly one token per Hangul/CJK character.
+
+    Hangul and CJK take 3 bytes in UTF-8, so the UTF-8 length gives the
+    number of such characters without a Python-level loop over the text.
+    """
+    non_ascii = (len(text.encode("utf-8", "surrogatepass")) - len(text)) // 2
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+
+def token_budget(generation_config, ratio=OUTPUT_BUDGET_RATIO):
+    """Estimated input tokens per chunk that keep the answer within max_output_tokens."""
+    return int(generation_config["max_output_tokens"] * ratio)
+
+
+def iter_units(text):
+    """
+    Splits text into the blocks a chunk boundary may fall between.
+
+    A block ends after a blank line (end of a paragraph) or after a page
+    number line (end of a page), so running headers and hard-wrapped
+    sentences stay in the same request as their context.
+
+    Yields:
+        str: Blocks; "\\n".join() of all of them gives back the text's lines.
+    """
+    unit = []
+    for line in text.splitlines():
+        unit.append(line)
+        if not line.strip() or PAGE_NUM_PATTERN.match(line):
+            yield "\n".join(unit)
+            unit = []
+    if unit:
+        yield "\n".join(unit)
+
+
+def _split_oversized(unit, max_tokens):
+    """
+    Breaks a block that does not fit into one chunk by itself.
+
+    Tries line ends first, then sentence ends inside an overlong line, and
+    only cuts mid-sentence when a single sentence is over budget.
+    """
+    pieces = []
+    for line in unit.split("\n"):
+        if estimate_tokens(line) <= max_tokens:
+            pieces.append(line)
+            continue
+        for sentence in SENTENCE_END_PATTERN.split(line):
+            tokens = estimate_tokens(sentence)
+            if tokens <= max_tokens:
+                pieces.append(sentence)
+                continue
+            # Proportional cut; the estimate is linear enough for this.
+            step = max(1, len(sentence) * max_tokens // tokens)
+            pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+    return pieces
+
+
+def _pack(pieces, max_tokens):
+    """Greedily groups pieces into runs of at most max_tokens (estimated)."""
+    groups = []
+    current = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def plan_chunks(text, max_tokens, overlap_tokens=0):
+    """
+    Packs text into as few requests as the token budget allows.
+
+    Chunks only break between paragraphs or pages (see iter_units). Each
+    chunk is filled up to max_tokens, so the model's answer fits in its
+    output limit and no request is wasted on a small chunk.
+
+    Args:
+        text (str): Raw text.
+        max_tokens (int): Estimated token budget per chunk, overlap included.
+        overlap_tokens (int): If set, each chunk after the first starts with
+            up to this many tokens of trailing blocks from the previous one,
+            so the model sees the context around the boundary. Use
+            join_chunk_outputs(..., overlap=True) to drop the repeats.
+
+    Returns:
+        list: Chunk texts, in order.
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 4)
+    body_tokens = max_tokens - overlap_tokens
+
+    pieces = []
+    for unit in iter_units(text):
+        if estimate_tokens(unit) > body_tokens:
+            pieces.extend(_split_oversized(unit, body_tokens))
+        else:
+            pieces.append(unit)
+    bodies = _pack(pieces, body_tokens)
+
+    chunks = []
+    for i, body in enumerate(bodies):
+        context = []
+        if overlap_tokens and i > 0:
+            # Whole blocks from the end of the previous chunk, newest last
+            used = 0
+            for piece in reversed(bodies[i - 1]):
+                used += estimate_tokens(piece)
+                if used > overlap_tokens:
+                    break
+                context.insert(0, piece)
+        chunks.append("\n".join(context + body))
+    return chunks
+
+
+def _normalize(paragraph):
+    return " ".join(paragraph.split())
+
+
+def _overlap_end(previous, new):
+    """
+    Finds where the repeated context ends in a chunk's answer.
+
+    The latest previous paragraph that shows up among the answer's first
+    paragraphs marks the end of the overlap. Searching from the end keeps a
+    header dropped by one answer but not the other from hiding the match.
+    Short paragraphs (running headers, "* * *") repeat all over a book, so
+    they never mark the end.
+
+    Returns:
+        tuple: (index in new where fresh paragraphs start,
+                True if new[index - 1] continues previous[-1] and should replace it)
+    """
+    window = [_normalize(p) for p in new[:OVERLAP_LOOKBACK]]
+    for back, paragraph in enumerate(reversed(previous)):
+        if len(paragraph) < MIN_FRAGMENT_LENGTH:
+            continue
+        for j in range(len(window) - 1, -1, -1):
+            candidate = window[j]
+            if len(candidate) < MIN_FRAGMENT_LENGTH:
+                continue
+            if candidate in paragraph:
+                return j + 1, False
+            if back == 0 and candidate.startswith(paragraph):
+                # The previous chunk stopped at a page break mid-paragraph
+                return j + 1, True
+    return 0, False
+
+
+def join_chunk_outputs(outputs, overlap=False):
+    """
+    Reassembles cleaned chunks into one text.
+
+    With overlap, a chunk's answer starts with paragraphs the previous
+    answer already has; they are dropped (see _overlap_end). Paragraphs are
+    compared with whitespace collapsed.
+
+    Args:
+        outputs (list): Cleaned chunk texts in order; None entries are skipped.
+        overlap (bool): Whether the chunks were planned with overlap_tokens.
+
+    Returns:
+        str: Cleaned text, paragraphs separated by blank lines.
+    """
+    outputs = [output for output in outputs if output is not None]
+    if not overlap:
+        return "\n\n".join(outputs)
+
+    paragraphs = []
+    for output in outputs:
+        new = [p for p in output.split("\n\n") if p.strip()]
+        if paragraphs:
+            previous = [_normalize(p) for p in paragraphs[-OVERLAP_LOOKBACK:]]
+            start, extends = _overlap_end(previous, new)
+            if extends:
+                paragraphs[-1] = new[start - 1]
+            new = new[start:]
+        paragraphs.extend(new)
+    return "\n\n".join(paragraphs)
@@ -1,94 +1,217 @@
 import re
+from header_detector import find_periodic_headers
 
-def clean_structure(text):
+# regex for page numbers (digits, or "- digits -", or "[digits]")
+PAGE_NUM_PATTERN = re.compile(r'^[\s\-]*\[?\d+\]?[\s\-]*$')
+
+# If a line appears this many times next to a page number, we assume it's noise.
+# (Adjustable, but 3 is a safe low number for a book)
+HEADER_MIN_COUNT = 3
+
+
+def count_header_neighbors(lines):
+    """
+    Counts how often each short line sits directly before or after a page number.
+
+    Works in a single pass over any line iterator, so it can run over a file
+    without loading it into memory.
+
+    Args:
+        lines (iterable): Lines of raw text (without line endings).
+
+    Returns:
+        dict: Stripped line content -> number of page-number neighbors.
+    """
+    neighbor_counts = {}
+    prev_line = None
+    prev_is_page = False
+
+    for line in lines:
+        is_page = PAGE_NUM_PATTERN.match(line) is not None
+
+        # Check line Before
+        if is_page and prev_line is not None:
+            stripped = prev_line.strip()
+            if stripped and len(stripped) < 100: # Headers are usually short
+                neighbor_counts[stripped] = neighbor_counts.get(stripped, 0) + 1
+
+        # Check line After (the current line follows a page number)
+        if prev_is_page:
+            stripped = line.strip()
+            if stripped and len(stripped) < 100:
+                neighbor_counts[stripped] = neighbor_counts.get(stripped, 0) + 1
+
+        prev_line = line
+        prev_is_page = is_page
+
+    return neighbor_counts
+
+
+def find_repeating_headers(neighbor_counts, min_count=HEADER_MIN_COUNT):
+    return {content for content, count in neighbor_counts.items() if count >= min_count}
+
+
+def is_dropped_line(line, stripped, repeating_headers, is_page=None):
+    """
+    True if iter_clean_lines drops this line.
+
+    Args:
+        line (str): Raw line.
+        stripped (str): line.strip().
+        repeating_headers (set): Stripped header lines to remove.
+        is_page (bool): PAGE_NUM_PATTERN result for the line, if the caller already has it.
+
+    Returns:
+        bool: Whether the line is a page number, a known header/footer or bare digits.
+    """
+    # Pure page numbers
+    if is_page is None:
+        is_page = PAGE_NUM_PATTERN.match(line) is not None
+    # Identified repeating headers, and pure digits even if the logic missed them (safety net)
+    return is_page or stripped in repeating_headers or stripped.isdigit()
+
+
+def iter_clean_lines(lines, repeating_headers):
+    """
+    Generator stage that drops page numbers and known headers/footers.
+
+    Args:
+        lines (iterable): Lines of raw text.
+        repeating_headers (set): Stripped header lines to remove.
+
+    Yields:
+        str: Lines that survive cleaning.
+    """
+    for line in lines:
+        if not is_dropped_line(line, line.strip(), repeating_headers):
+            yield line
+
+
+def clean_structure(text, periodic_headers=False):
     """
     Cleans the text by removing page numbers and recurring headers/footers.
     
     Args:
         text (str): Raw text content.
+        periodic_headers (bool): Also remove headers found by how regularly they
+            repeat (see header_detector), which works without page numbers.
         
     Returns:
         str: Cleaned text.
     """
     lines = text.splitlines()
     
-    # regex for page numbers (digits, or "- digits -", or "[digits]")
-    page_num_pattern = re.compile(r'^[\s\-]*\[?\d+\]?[\s\-]*$')
-    
-    # 1. Identify Page Number Indices and Candidate Headers
-    page_indices = []
-    for i, line in enumerate(lines):
-        if page_num_pattern.match(line):
-            page_indices.append(i)
-            
-    # 2. Analyze Neighbors (Predecessors and Successors)
+    # 1. Analyze Neighbors (Predecessors and Successors)
     # We look at lines immediately before and after page numbers.
     # If the same line content appears frequently next to page numbers, it's likely a header/footer.
+    repeating_headers = find_repeating_headers(count_header_neighbors(lines))
+
+    if periodic_headers:
+        # Headers that carry page numbers, alternate between pages, or sit in a book without page numbers
+        drop = find_periodic_headers(lines)
+        lines = [line for i, line in enumerate(lines) if i not in drop]
     
-    neighbor_counts = {}
-    
-    for idx in page_indices:
-        # Check line Before
-        if idx > 0:
-            prev_line = lines[idx-1].strip()
-            if prev_line and len(prev_line) < 100: # Headers are usually short
-                 neighbor_counts[prev_line] = neighbor_counts.get(prev_line, 0) + 1
-                 
-        # Check line After
-        if idx < len(lines) - 1:
-            next_line = lines[idx+1].strip()
-            if next_line and len(next_line) < 100:
-                neighbor_counts[next_line] = neighbor_counts.get(next_line, 0) + 1
-                
-    # Threshold for deciding a line is a header.
-    # If a line appears more than 3 times next to a page number, we assume it's noise.
-    # (Adjustable, but 3 is a safe low number for a book)
-    repeating_headers = {content for content, count in neighbor_counts.items() if count >= 3}
-    
-    # 3. Filtering Pass
-    final_lines = []
-    for i, line in enumerate(lines):
-        stripped = line.strip()
-        
-        # Skip pure page numbers
-        if page_num_pattern.match(line):
-            continue
-            
-        # Skip identified repeating headers
-        if stripped in repeating_headers:
-            continue
-            
-        # Optional: Skip pure digits even if logic missed them (safety net)
-        if stripped.isdigit():
-            continue
-            
-        final_lines.append(line)
-        
-    return "\n".join(final_lines)
+    # 2. Filtering Pass
+    return "\n".join(iter_clean_lines(lines, repeating_headers))
+
+class TitleMatcher:
+    """
+    Aho-Corasick automaton over a set of titles.
+
+    longest_match() finds the longest title contained in a string in a
+    single pass over it, however many titles there are.
+    """
+
+    def __init__(self, titles):
+        self.titles = list(titles)
+        self.max_length = max((len(t) for t in self.titles), default=0)
+        self.has_empty = any(not t for t in self.titles)
+
+        # goto[node] maps a character to the next node; out[node] is the length
+        # of the longest title ending at node (following failure links), or -1.
+        goto = [{}]
+        out = [-1]
+        for title in self.titles:
+            node = 0
+            for c in title:
+                nxt = goto[node].get(c)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][c] = nxt
+                    goto.append({})
+                    out.append(-1)
+                node = nxt
+            out[node] = max(out[node], len(title))
+
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            for c, nxt in goto[node].items():
+                queue.append(nxt)
+                f = fail[node]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(c, 0) if goto[f].get(c, 0) != nxt else 0
+                out[nxt] = max(out[nxt], out[fail[nxt]])
+
+        self.goto = goto
+        self.fail = fail
+        self.out = out
+
+    def longest_match(self, text):
+        """Length of the longest title contained in text, or -1 if none is."""
+        goto, fail, out = self.goto, self.fail, self.out
+        best = 0 if self.has_empty else -1
+        node = 0
+        for c in text:
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            if out[node] > best:
+                best = out[node]
+        return best
+
+
+PURE_NUMBER_PATTERN = re.compile(r'^[\s\-]*\d+[\s\-]*$')
+
 
 def sophisticated_clean(text, known_chapter_titles=None):
     """
     Experimental cleaner that uses known chapter titles to remove headers.
+
+    A line is dropped as a header when it contains a known title and a digit
+    and is shorter than that title plus 10 characters.
+
+    Args:
+        text (str): Raw text content.
+        known_chapter_titles (list or TitleMatcher): Titles to look for. Pass a
+            prebuilt TitleMatcher to reuse it across calls.
+
+    Returns:
+        str: Cleaned text.
     """
-    lines = text.splitlines()
+    matcher = None
+    if known_chapter_titles:
+        matcher = known_chapter_titles if isinstance(known_chapter_titles, TitleMatcher) else TitleMatcher(known_chapter_titles)
+        if not matcher.titles:
+            matcher = None
+
     cleaned = []
-    for line in lines:
+    for line in text.splitlines():
         stripped = line.strip()
         
         # Pure numbers
-        if re.match(r'^[\s\-]*\d+[\s\-]*$', stripped):
+        if PURE_NUMBER_PATTERN.match(stripped):
             continue
             
-        # Check if line contains a known chapter title AND a number, and is short
-        is_header = False
-        if known_chapter_titles:
-            for title in known_chapter_titles:
-                if title in stripped and any(c.isdigit() for c in stripped):
-                    if len(stripped) < len(title) + 10: # Heuristic: title + page number + minimal extra
-                        is_header = True
-                        break
-        
-        if not is_header:
-            cleaned.append(line)
+        # Check if line contains a known chapter title AND a number, and is short.
+        # Heuristic: title + page number + minimal extra, so only titles at least
+        # len(stripped) - 9 long can qualify; cheap checks go first.
+        if matcher is not None and len(stripped) - 9 <= matcher.max_length and any(c.isdigit() for c in stripped):
+            longest = matcher.longest_match(stripped)
+            if longest >= 0 and longest >= len(stripped) - 9:
+                continue
+
+        cleaned.append(line)
             
     return "\n".join(cleaned)
@@ -0,0 +1,374 @@
+import argparse
+import hashlib
+import json
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pipeline import convert_file
+
+# Seconds between inbox scans
+POLL_INTERVAL = 2.0
+
+# Finished jobs kept for the latency percentiles
+LATENCY_WINDOW = 1000
+
+# Remembers which contents were converted, so a restart does not redo them
+STATE_FILE_NAME = ".txt_to_epub_daemon.json"
+
+
+class Job:
+    """A queued inbox file."""
+
+    def __init__(self, input_path, digest):
+        self.input_path = input_path
+        self.digest = digest
+        self.queued_at = time.time()
+        self.started_at = None
+        self.part_path = None # Temporary file in the outbox
+        self.output_path = None
+
+
+def file_digest(path, block_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list (None if empty)."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def _write_json_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _init_worker():
+    # Ctrl+C reaches the whole process group; only the daemon decides when to stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _convert_job(input_path, part_path, author, periodic_headers):
+    # Runs inside a worker process. Errors come back as text so the daemon
+    # can record them and carry on.
+    start = time.perf_counter()
+    try:
+        convert_file(input_path, part_path, author=author, periodic_headers=periodic_headers)
+        return None, time.perf_counter() - start
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", time.perf_counter() - start
+
+
+class WatchDaemon:
+    """
+    Watches an inbox directory and converts every new or changed .txt file.
+
+    Files are picked up once their size and modification time stop changing
+    between two scans (so half-copied files are left alone) and are queued
+    by content hash: a file whose exact content was already converted, or
+    is already queued, is skipped. A bounded process pool runs the regular
+    pipeline; each EPUB is written to a temporary file in the outbox and
+    renamed into place, so readers never see a partial book.
+
+    Inbox files that would write the same EPUB (a.txt and a.TXT) are not
+    allowed to overwrite each other: the first in name order is converted,
+    the others are reported as failed until they change.
+    """
+
+    def __init__(self, inbox, outbox, workers=None, poll_interval=POLL_INTERVAL, status_path=None,
+                 author=None, periodic_headers=False, log_callback=None):
+        self.inbox = inbox
+        self.outbox = outbox
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.poll_interval = poll_interval
+        self.status_path = status_path
+        self.author = author
+        self.periodic_headers = periodic_headers
+        self.log = log_callback or (lambda message: None)
+
+        self.queue = deque()
+        self.in_flight = {} # future -> Job
+        self.seen = {} # path -> (size, mtime_ns, digest or None while settling)
+        self.queued_digests = set()
+        self.latencies = deque(maxlen=LATENCY_WINDOW) # queued -> written, seconds
+        self.completed = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.recent_errors = deque(maxlen=20)
+        self.started_at = time.time()
+
+        self.stop_event = threading.Event()
+        self.status_lock = threading.Lock()
+        self.status = {}
+
+        os.makedirs(outbox, exist_ok=True)
+        self.state_path = os.path.join(outbox, STATE_FILE_NAME)
+        self.done_digests = {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.done_digests = json.load(f).get("converted", {})
+        except (OSError, ValueError):
+            pass
+
+    def scan(self):
+        """Queues inbox files that are new or changed and have settled."""
+        try:
+            names = sorted(os.listdir(self.inbox))
+        except OSError as e:
+            self.log(f"Cannot read inbox: {e}")
+            return
+
+        names = [name for name in names if name.lower().endswith(".txt") and not name.startswith(".")]
+        # Output -> the inbox file allowed to write it
+        owners = {}
+        for name in names:
+            path = os.path.join(self.inbox, name)
+            owners.setdefault(os.path.normcase(self.output_path(path)), path)
+
+        present = set()
+        for name in names:
+            path = os.path.join(self.inbox, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if not os.path.isfile(path):
+                continue
+            present.add(path)
+
+            signature = (st.st_size, st.st_mtime_ns)
+            previous = self.seen.get(path)
+            if previous is None or previous[:2] != signature:
+                # New or still being written: look again next scan
+                self.seen[path] = signature + (None,)
+                continue
+            if previous[2] is not None:
+                continue # Unchanged since it was handled
+
+            owner = owners[os.path.normcase(self.output_path(path))]
+            if owner != path:
+                self.seen[path] = signature + ("",) # Handled; looked at again once it changes
+                self.record_failure(name, f"Would overwrite {os.path.basename(self.output_path(path))}, "
+                                          f"the output of {os.path.basename(owner)}")
+                continue
+
+            try:
+                digest = file_digest(path)
+            except OSError:
+                continue
+            self.seen[path] = signature + (digest,)
+
+            if digest in self.done_digests or digest in self.queued_digests:
+                self.duplicates += 1
+                self.log(f"Skipping {name}: same content already converted or queued")
+                continue
+            self.queued_digests.add(digest)
+            self.queue.append(Job(path, digest))
+            self.log(f"Queued {name}")
+
+        # Forget deleted files, so putting them back counts as new
+        for path in list(self.seen):
+            if path not in present:
+                del self.seen[path]
+
+    def output_path(self, input_path):
+        base = os.path.splitext(os.path.basename(input_path))[0]
+        return os.path.join(self.outbox, base + ".epub")
+
+    def record_failure(self, name, error):
+        self.failed += 1
+        self.recent_errors.append({"file": name, "error": error, "at": time.time()})
+        self.log(f"Failed {name}: {error}")
+
+    def dispatch(self, pool):
+        """Starts queued jobs while fewer than `workers` are running."""
+        while self.queue and len(self.in_flight) < self.workers:
+            job = self.queue.popleft()
+            job.started_at = time.time()
+            base = os.path.splitext(os.path.basename(job.input_path))[0]
+            try:
+                fd, part_path = tempfile.mkstemp(dir=self.outbox, prefix=f".{base}.", suffix=".epub.part")
+                os.close(fd)
+            except OSError as e:
+                self.queued_digests.discard(job.digest)
+                self.record_failure(os.path.basename(job.input_path), f"Cannot write to the outbox: {e}")
+                continue
+            job.part_path = part_path
+            job.output_path = self.output_path(job.input_path)
+            future = pool.submit(_convert_job, job.input_path, part_path, self.author, self.periodic_headers)
+            self.in_flight[future] = job
+
+    def collect(self, timeout):
+        """Waits up to timeout for running jobs and publishes the finished ones."""
+        if not self.in_flight:
+            self.stop_event.wait(timeout)
+            return
+        done, _ = wait(list(self.in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            job = self.in_flight.pop(future)
+            self.queued_digests.discard(job.digest)
+            try:
+                error, seconds = future.result()
+            except Exception as e:
+                # The worker process itself died
+                error, seconds = f"{type(e).__name__}: {e}", time.time() - job.started_at
+
+            name = os.path.basename(job.input_path)
+            if error is None:
+                try:
+                    # mkstemp creates the file private to us; published books should be readable like any other file
+                    os.chmod(job.part_path, 0o644)
+                    os.replace(job.part_path, job.output_path)
+                except OSError as e:
+                    # Permissions, a full disk, the part file removed under us: fail this job, not the daemon
+                    error = f"Cannot publish {os.path.basename(job.output_path)}: {type(e).__name__}: {e}"
+
+            if error is None:
+                self.completed += 1
+                self.latencies.append(time.time() - job.queued_at)
+                self.done_digests[job.digest] = os.path.basename(job.output_path)
+                self.log(f"Converted {name} -> {job.output_path} ({seconds:.2f}s)")
+                try:
+                    _write_json_atomic(self.state_path, {"converted": self.done_digests})
+                except OSError as e:
+                    # The book is out; only the restart bookkeeping is stale until the next success
+                    self.log(f"Cannot write state file: {e}")
+            else:
+                try:
+                    os.remove(job.part_path)
+                except OSError:
+                    pass
+                # Not retried until the file changes (scan() only rehashes on a new size/mtime)
+                self.record_failure(name, error)
+
+    def snapshot(self):
+        latencies = sorted(self.latencies)
+        return {
+            "inbox": os.path.abspath(self.inbox),
+            "outbox": os.path.abspath(self.outbox),
+            "started_at": self.started_at,
+            "updated_at": time.time(),
+            "workers": self.workers,
+            "queue_depth": len(self.queue),
+            "in_flight": len(self.in_flight),
+            "in_flight_files": [os.path.basename(job.input_path) for job in self.in_flight.values()],
+            "completed": self.completed,
+            "failed": self.failed,
+            "duplicates_skipped": self.duplicates,
+            "latency_seconds": {
+                "count": len(latencies),
+                "p50": percentile(latencies, 0.50),
+                "p90": percentile(latencies, 0.90),
+                "p99": percentile(latencies, 0.99),
+            },
+            "recent_errors": list(self.recent_errors),
+        }
+
+    def publish_status(self):
+        status = self.snapshot()
+        with self.status_lock:
+            self.status = status
+        if self.status_path:
+            try:
+                _write_json_atomic(self.status_path, status)
+            except OSError as e:
+                self.log(f"Cannot write status file: {e}")
+
+    def run(self):
+        """Scans, dispatches and collects until stop() is called, then drains running jobs."""
+        self.log(f"Watching {self.inbox} -> {self.outbox} with {self.workers} worker(s)")
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker) as pool:
+            while not self.stop_event.is_set():
+                self.scan()
+                self.dispatch(pool)
+                self.publish_status()
+                self.collect(self.poll_interval)
+
+            # Finish what is running; queued jobs are picked up again on the next start
+            while self.in_flight:
+                self.collect(self.poll_interval)
+            self.publish_status()
+        self.log("Stopped.")
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def serve_status(daemon, port, host="127.0.0.1"):
+    """Serves the daemon's status as JSON on http://host:port/ from a background thread."""
+
+    class StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/status"):
+                self.send_error(404)
+                return
+            with daemon.status_lock:
+                body = json.dumps(daemon.status, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass # Keep polling clients out of the daemon log
+
+    server = ThreadingHTTPServer((host, port), StatusHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch a folder and convert every .txt dropped into it to EPUB.")
+    parser.add_argument("inbox", help="Directory to watch for .txt files")
+    parser.add_argument("outbox", help="Directory for the generated EPUBs")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Conversions running at once (default: up to 4)")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help="Seconds between inbox scans")
+    parser.add_argument("--status-file", help="Write queue/latency status as JSON to this path")
+    parser.add_argument("--http-port", type=int, help="Serve the status as JSON on http://127.0.0.1:PORT/")
+    parser.add_argument("--author", help="Author name for every book (default: Unknown)")
+    parser.add_argument("--periodic-headers", action="store_true",
+                        help="Also remove running headers found by how regularly they repeat")
+    args = parser.parse_args(argv)
+
+    def log(message):
+        print(f"{time.strftime('%H:%M:%S')} {message}", flush=True)
+
+    daemon = WatchDaemon(args.inbox, args.outbox, args.workers, args.interval, args.status_file, args.author,
+                         args.periodic_headers, log_callback=log)
+
+    server = None
+    if args.http_port:
+        server = serve_status(daemon, args.http_port)
+        log(f"Status on http://127.0.0.1:{args.http_port}/")
+
+    def handle_signal(signum, frame):
+        log("Stopping after the running conversions...")
+        daemon.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    try:
+        daemon.run()
+    finally:
+        if server:
+            server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
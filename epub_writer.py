@@ -0,0 +1,434 @@
+import os
+import re
+import uuid
+import zipfile
+from datetime import datetime, timezone
+from html import escape
+from line_classes import CHAPTER_HEADING, HEADING_CANDIDATE, SHORT_HEADING, classify_line
+
+# A chapter file is split at the next paragraph boundary once it passes this many characters,
+# even if no new chapter heading was found. Keeps e-readers fast and memory per chapter bounded.
+CHAPTER_SIZE = 200_000
+
+# Short-line headings are noisy (dialogue fragments look like them too), so only the first
+# few sections of each chapter are listed in the TOC. Also keeps the TOC small on huge inputs.
+TOC_SECTION_LIMIT = 50
+
+# "ebooklib" assembles the whole book with ebooklib before writing it;
+# "native" streams each chapter into the zip as it is produced (StreamingEpubWriter).
+WRITERS = ("ebooklib", "native")
+DEFAULT_WRITER = "ebooklib"
+
+# zlib level for the native writer: 1 is fastest, 9 smallest. 6 is zlib's own default.
+DEFAULT_COMPRESSION_LEVEL = 6
+
+# Characters XML 1.0 does not allow, even escaped: C0 controls (e.g. the \x1a
+# end-of-file marker of old DOS files), lone surrogates, U+FFFE and U+FFFF
+INVALID_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+# HTML tag for every combination of line_classes flag bits
+# Heuristic: a short paragraph that does not end with punctuation is a header,
+# and a chapter header if it also matches HEADER_PATTERN.
+PARAGRAPH_TAGS = tuple(
+    ("h2" if flags & CHAPTER_HEADING else "h3") if flags & SHORT_HEADING
+    else "strong" if flags & HEADING_CANDIDATE
+    else "p"
+    for flags in range(8)
+)
+
+
+def paragraph_to_html(clean_p):
+    """
+    Classifies one stripped paragraph and renders its escaped text.
+
+    Returns:
+        tuple: (tag, escaped inner html) where tag is "h2", "h3", "strong" or "p".
+    """
+    return PARAGRAPH_TAGS[classify_line(clean_p)], escape(clean_p, quote=False)
+
+
+class TocEntry:
+    """One table-of-contents entry; chapter (h2) entries hold their h3 sections as children."""
+
+    __slots__ = ("title", "href", "children")
+
+    def __init__(self, title, href):
+        self.title = title
+        self.href = href
+        self.children = []
+
+
+class Chapter:
+    """One XHTML document of the book."""
+
+    def __init__(self, file_name, title, body):
+        self.file_name = file_name
+        self.title = title
+        self.body = body
+
+
+class ChapterBuilder:
+    """
+    Groups paragraphs into chapter documents and collects a nested TOC.
+
+    A new chapter starts at every "h2" heading, or at the next paragraph once
+    the current chapter passes chapter_size characters. Fragments are
+    collected in a list and joined once per chapter, so assembly is linear
+    and only one chapter is held in memory at a time.
+    """
+
+    def __init__(self, title, chapter_size=CHAPTER_SIZE, file_prefix="chapter_", include_title=True):
+        """
+        Args:
+            title (str): Book title.
+            chapter_size (int): Approximate characters per chapter file.
+            file_prefix (str): Prefix for generated file names.
+            include_title (bool): Open with the book title (False when building a later part of a book on its own).
+        """
+        self.title = title
+        self.chapter_size = chapter_size
+        self.file_prefix = file_prefix
+        self.include_title = include_title
+        self.toc = []
+        self.chapter_count = 0
+        self.anchor_count = 0
+
+    def iter_chapters(self, paragraphs):
+        """
+        Args:
+            paragraphs (iterable): Merged paragraphs.
+
+        Yields:
+            Chapter: Completed chapter documents, in order.
+        """
+        parts = [f"<h1>{escape(self.title, quote=False)}</h1>\n"] if self.include_title else []
+        size = 0
+        has_content = False
+        file_name = self._next_file_name()
+        chapter_title = self.title
+        current_entry = None
+
+        for p in paragraphs:
+            clean_p = p.strip()
+            if not clean_p.isprintable():
+                # Rare; isprintable() is much cheaper than running the regex on every paragraph
+                clean_p = INVALID_XML_CHARS.sub("", clean_p).strip()
+            if not clean_p:
+                continue
+
+            tag, text = paragraph_to_html(clean_p)
+
+            if has_content and (tag == "h2" or size >= self.chapter_size):
+                yield Chapter(file_name, chapter_title, "".join(parts))
+                parts = []
+                size = 0
+                file_name = self._next_file_name()
+
+            if tag in ("h2", "h3"):
+                self.anchor_count += 1
+                anchor = f"h{self.anchor_count}"
+                fragment = f'<{tag} id="{anchor}">{text}</{tag}>\n'
+                if tag == "h2":
+                    chapter_title = clean_p
+                    current_entry = TocEntry(clean_p, file_name)
+                    self.toc.append(current_entry)
+                elif current_entry is None and not self.include_title:
+                    # No title entry to hang early sections off (a later part of a book)
+                    if len(self.toc) < TOC_SECTION_LIMIT:
+                        self.toc.append(TocEntry(clean_p, f"{file_name}#{anchor}"))
+                else:
+                    if current_entry is None:
+                        # Sections before the first chapter heading hang off the title entry
+                        current_entry = TocEntry(self.title, self._file_name(1))
+                        self.toc.append(current_entry)
+                    if len(current_entry.children) < TOC_SECTION_LIMIT:
+                        current_entry.children.append(TocEntry(clean_p, f"{file_name}#{anchor}"))
+            elif tag == "strong":
+                fragment = f"<p><strong>{text}</strong></p>\n"
+            else:
+                fragment = f"<p>{text}</p>\n"
+
+            parts.append(fragment)
+            size += len(fragment)
+            has_content = True
+
+        if not self.toc and self.include_title:
+            self.toc.append(TocEntry(self.title, self._file_name(1)))
+        yield Chapter(file_name, chapter_title, "".join(parts))
+
+    def _file_name(self, number):
+        return f"{self.file_prefix}{number:04d}.xhtml"
+
+    def _next_file_name(self):
+        self.chapter_count += 1
+        return self._file_name(self.chapter_count)
+
+
+def _ebooklib_toc(entries):
+    from ebooklib import epub
+    toc = []
+    for entry in entries:
+        if entry.children:
+            toc.append((epub.Section(entry.title, href=entry.href), _ebooklib_toc(entry.children)))
+        else:
+            toc.append(epub.Link(entry.href, entry.title, entry.href.replace('#', '_').replace('.', '_')))
+    return toc
+
+
+def create_epub(text, output_path, title, author, chapter_size=CHAPTER_SIZE, writer=DEFAULT_WRITER,
+                compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Builds an EPUB file from merged text.
+
+    Args:
+        text (str or iterable): Merged text, paragraphs separated by blank lines,
+            or the paragraphs themselves (e.g. from fused.iter_fused_paragraphs).
+        output_path (str): Destination .epub path.
+        title (str): Book title.
+        author (str): Author name.
+        chapter_size (int): Approximate characters per chapter file.
+        writer (str): One of WRITERS. "native" never holds more than one chapter in memory.
+        compression_level (int): zlib level 0-9 for the native writer.
+    """
+    # The merger puts double newlines between paragraphs.
+    paragraphs = text.split('\n\n') if isinstance(text, str) else text
+    builder = ChapterBuilder(title, chapter_size)
+    _write_book(builder.iter_chapters(paragraphs), builder.toc, output_path, title, author, writer,
+                compression_level)
+
+
+def create_epub_from_chapters(chapters, toc, output_path, title, author, writer=DEFAULT_WRITER,
+                              compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Builds an EPUB file from already rendered chapters (e.g. cached ones).
+
+    Args:
+        chapters (iterable): Chapter objects, in reading order.
+        toc (list): TocEntry list for the whole book.
+        output_path (str): Destination .epub path.
+        title (str): Book title.
+        author (str): Author name.
+        writer (str): One of WRITERS.
+        compression_level (int): zlib level 0-9 for the native writer.
+    """
+    _write_book(chapters, toc, output_path, title, author, writer, compression_level)
+
+
+def _write_book(chapters, toc, output_path, title, author, writer=DEFAULT_WRITER,
+                compression_level=DEFAULT_COMPRESSION_LEVEL):
+    if writer == "native":
+        with StreamingEpubWriter(output_path, title, author, compression_level=compression_level) as book:
+            for chapter in chapters:
+                book.add_chapter(chapter)
+            # The TOC is complete once the chapters are consumed
+            book.close(toc)
+        return
+    if writer != "ebooklib":
+        raise ValueError(f"Unknown EPUB writer {writer!r}; expected one of {', '.join(WRITERS)}")
+
+    # ebooklib (and lxml under it) is only imported when a book is written this way;
+    # the streaming writer and the cleaning code do not need it.
+    from ebooklib import epub
+    book = epub.EpubBook()
+
+    # Metadata
+    book.set_identifier('id_123456') # Random ID
+    book.set_title(title)
+    book.set_language('en') # Defaulting to en, could be passed or detected
+    book.add_author(author)
+
+    items = []
+    for chapter in chapters:
+        item = epub.EpubHtml(title=chapter.title, file_name=chapter.file_name, lang='en')
+        item.content = chapter.body
+        book.add_item(item)
+        items.append(item)
+
+    # TOC (read after the chapters are consumed, since a builder fills it as it goes)
+    book.toc = _ebooklib_toc(toc)
+
+    # Navigation
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+
+    # Spine
+    book.spine = ['nav'] + items
+
+    # Write
+    epub.write_epub(output_path, book)
+
+
+class StreamingEpubWriter:
+    """
+    Writes an EPUB 3 container chapter by chapter.
+
+    Each chapter's XHTML goes straight into the zip archive when it is
+    added, so only the current chapter and the chapter list are held in
+    memory. The OPF, nav and NCX documents are written on close().
+    Unlike the ebooklib path, no document is parsed or re-serialized.
+
+    The archive is written under a temporary name next to output_path and
+    only renamed to it by close(), so a conversion that fails midway never
+    leaves a truncated EPUB behind.
+    """
+
+    def __init__(self, output_path, title, author, language='en', compression_level=DEFAULT_COMPRESSION_LEVEL):
+        """
+        Args:
+            output_path (str): Destination .epub path.
+            title (str): Book title.
+            author (str): Author name.
+            language (str): Language code for the package and documents.
+            compression_level (int): zlib level 0-9 for every entry but the mimetype.
+        """
+        if not 0 <= compression_level <= 9:
+            raise ValueError(f"compression_level must be between 0 and 9, got {compression_level}")
+        self.title = title
+        self.author = author
+        self.language = language
+        self.identifier = f"urn:uuid:{uuid.uuid4()}"
+        self.file_names = []
+        self.output_path = output_path
+        # Hidden and unique, in the same directory so the final rename is atomic
+        directory, name = os.path.split(os.path.abspath(output_path))
+        self._tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.tmp")
+        self._finished = False
+
+        self._zip = zipfile.ZipFile(self._tmp_path, 'w', compression=zipfile.ZIP_DEFLATED,
+                                    compresslevel=compression_level)
+        # The mimetype entry must come first and be stored uncompressed.
+        self._zip.writestr(zipfile.ZipInfo('mimetype'), 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        self._zip.writestr('META-INF/container.xml', CONTAINER_XML)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._finished:
+            # Failed (or never closed): an archive without its package document is no EPUB
+            self._zip.close()
+            try:
+                os.remove(self._tmp_path)
+            except FileNotFoundError:
+                pass
+
+    def add_chapter(self, chapter):
+        self._write_entry(f"EPUB/{chapter.file_name}", _xhtml_document(chapter.title, self.language, chapter.body))
+        self.file_names.append(chapter.file_name)
+
+    def close(self, toc):
+        self._write_entry('EPUB/content.opf', self._package_document())
+        self._write_entry('EPUB/nav.xhtml', self._nav_document(toc))
+        self._write_entry('EPUB/toc.ncx', self._ncx_document(toc))
+        self._zip.close()
+        os.replace(self._tmp_path, self.output_path)
+        self._finished = True
+
+    def _write_entry(self, name, pieces):
+        # Documents are produced piece by piece so a huge TOC (or chapter) is never held as one string.
+        # Opening by name uses the archive's compression and level.
+        with self._zip.open(name, 'w') as f:
+            for piece in pieces:
+                f.write(piece.encode('utf-8'))
+
+    def _package_document(self):
+        modified = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        yield (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="id">\n'
+            '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">\n'
+            f'<dc:identifier id="id">{escape(self.identifier)}</dc:identifier>\n'
+            f'<dc:title>{escape(self.title)}</dc:title>\n'
+            f'<dc:language>{escape(self.language)}</dc:language>\n'
+            f'<dc:creator id="creator">{escape(self.author)}</dc:creator>\n'
+            f'<meta property="dcterms:modified">{modified}</meta>\n'
+            '</metadata>\n<manifest>\n'
+            '<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>\n'
+            '<item id="ncx" href="toc.ncx" media-type="application/x-dtbncx+xml"/>\n'
+        )
+        for i, file_name in enumerate(self.file_names, 1):
+            yield f'<item id="chapter_{i}" href="{file_name}" media-type="application/xhtml+xml"/>\n'
+        yield '</manifest>\n<spine toc="ncx">\n<itemref idref="nav"/>\n'
+        for i in range(1, len(self.file_names) + 1):
+            yield f'<itemref idref="chapter_{i}"/>\n'
+        yield '</spine>\n</package>\n'
+
+    def _nav_document(self, toc):
+        def render(entries):
+            for entry in entries:
+                yield f'<li><a href="{escape(entry.href)}">{escape(entry.title)}</a>'
+                if entry.children:
+                    yield "\n<ol>\n"
+                    yield from render(entry.children)
+                    yield "</ol>\n"
+                yield "</li>\n"
+
+        yield (
+            '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+            f'<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="{escape(self.language)}" xml:lang="{escape(self.language)}">\n'
+            f'<head><title>{escape(self.title)}</title></head>\n<body>\n'
+            f'<nav epub:type="toc" id="id"><h2>{escape(self.title)}</h2>\n<ol>\n'
+        )
+        yield from render(toc)
+        yield '</ol>\n</nav>\n</body>\n</html>\n'
+
+    def _ncx_document(self, toc):
+        play_order = [0]
+
+        def render(entries):
+            for entry in entries:
+                play_order[0] += 1
+                n = play_order[0]
+                yield (
+                    f'<navPoint id="navpoint_{n}" playOrder="{n}"><navLabel><text>{escape(entry.title)}</text></navLabel>'
+                    f'<content src="{escape(entry.href)}"/>'
+                )
+                yield from render(entry.children)
+                yield '</navPoint>\n'
+
+        yield (
+            '<?xml version="1.0" encoding="utf-8"?>\n'
+            '<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">\n'
+            f'<head><meta name="dtb:uid" content="{escape(self.identifier)}"/></head>\n'
+            f'<docTitle><text>{escape(self.title)}</text></docTitle>\n<navMap>\n'
+        )
+        yield from render(toc)
+        yield '</navMap>\n</ncx>\n'
+
+
+CONTAINER_XML = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">\n'
+    '<rootfiles><rootfile full-path="EPUB/content.opf" media-type="application/oebps-package+xml"/></rootfiles>\n'
+    '</container>\n'
+)
+
+
+def _xhtml_document(title, language, body):
+    # Yields the document in pieces, so the body is written as is instead of copied into a bigger string
+    yield (
+        '<?xml version="1.0" encoding="utf-8"?>\n<!DOCTYPE html>\n'
+        f'<html xmlns="http://www.w3.org/1999/xhtml" lang="{escape(language)}" xml:lang="{escape(language)}">\n'
+        f'<head><title>{escape(title)}</title></head>\n<body>\n'
+    )
+    yield body
+    yield '</body>\n</html>\n'
+
+
+def write_epub_streaming(paragraphs, output_path, title, author, chapter_size=CHAPTER_SIZE,
+                         compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Writes an EPUB from a paragraph iterator without holding the book in memory.
+
+    Chapters are split exactly as in create_epub and written to the archive
+    as soon as each one is complete.
+
+    Args:
+        paragraphs (iterable): Merged paragraphs, e.g. from iter_merge_paragraphs.
+        output_path (str): Destination .epub path.
+        title (str): Book title.
+        author (str): Author name.
+        chapter_size (int): Approximate characters per chapter file.
+        compression_level (int): zlib level 0-9.
+    """
+    create_epub(paragraphs, output_path, title, author, chapter_size, "native", compression_level)
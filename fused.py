@@ -0,0 +1,76 @@
+from cleaner import HEADER_MIN_COUNT, PAGE_NUM_PATTERN, is_dropped_line
+from merger import detect_blank_lines, merge_stripped_lines
+from header_detector import find_periodic_headers
+
+
+def iter_fused_paragraphs(lines, periodic_headers=False):
+    """
+    Single-pass equivalent of merge_paragraphs(clean_structure(text)).
+
+    Page-number detection, header suppression and paragraph merging all work
+    on one line array. Each line is stripped and matched against the page
+    number pattern exactly once, and no intermediate copy of the book is
+    built, so paragraphs can go straight to the EPUB writer.
+
+    Args:
+        lines (list): Raw lines (e.g. text.splitlines()).
+        periodic_headers (bool): Also drop headers found by header_detector,
+            like clean_structure(text, periodic_headers=True).
+
+    Yields:
+        str: Merged paragraphs, identical to the two-stage pipeline's.
+    """
+    stripped = [line.strip() for line in lines]
+    is_page = [PAGE_NUM_PATTERN.match(line) is not None for line in lines]
+    last = len(lines) - 1
+
+    # 1. Header statistics: short lines right before/after page numbers
+    neighbor_counts = {}
+    for i, page in enumerate(is_page):
+        if not page:
+            continue
+        if i > 0:
+            s = stripped[i - 1]
+            if s and len(s) < 100:
+                neighbor_counts[s] = neighbor_counts.get(s, 0) + 1
+        if i < last:
+            s = stripped[i + 1]
+            if s and len(s) < 100:
+                neighbor_counts[s] = neighbor_counts.get(s, 0) + 1
+    repeating_headers = {content for content, count in neighbor_counts.items() if count >= HEADER_MIN_COUNT}
+
+    # 2. Which lines survive cleaning
+    kept = [i for i, page in enumerate(is_page) if not is_dropped_line(lines[i], stripped[i], repeating_headers, page)]
+    if periodic_headers:
+        drop = find_periodic_headers(lines)
+        kept = [i for i in kept if i not in drop]
+
+    has_blank_lines = detect_blank_lines(lines[i] for i in kept)
+
+    # 3. Merge
+    yield from merge_kept_lines(stripped, kept, has_blank_lines)
+
+
+def merge_kept_lines(stripped, kept, has_blank_lines):
+    """
+    The merge step of iter_fused_paragraphs, on its own.
+
+    Args:
+        stripped (list): Stripped lines.
+        kept (iterable): Indices of the lines that survive cleaning, ascending.
+        has_blank_lines (bool): Paragraph mode, as decided for the whole book.
+
+    Yields:
+        str: Merged paragraphs.
+    """
+    yield from merge_stripped_lines(map(stripped.__getitem__, kept), has_blank_lines)
+
+
+def fused_clean_and_merge(text, periodic_headers=False):
+    """
+    Drop-in replacement for merge_paragraphs(clean_structure(text, periodic_headers)).
+
+    Returns:
+        str: Paragraphs separated by blank lines.
+    """
+    return "\n\n".join(iter_fused_paragraphs(text.splitlines(), periodic_headers))
@@ -0,0 +1,321 @@
+"""
+Golden-output and differential checks for the cleaning engines.
+
+    python -m golden.harness                        # goldens + every engine vs. the reference
+    python -m golden.harness --engine fused --engine parallel
+    python -m golden.harness --engine mymodule:my_engine
+    python -m golden.harness --synthetic-mb 20      # also compare (and time) on large generated books
+    python -m golden.harness --update               # rewrite the goldens after an intended change
+
+The reference is merge_paragraphs(clean_structure(text)). Its output on
+every file in golden/corpus is pinned in golden/expected, together with
+the chapters create_epub renders from it, so a change in clean_structure,
+merge_paragraphs, is_short_heading/is_heading_candidate or the HTML
+emitter shows up as a golden diff. Every other engine must produce the
+reference's text exactly; for each one the harness prints the first
+differing paragraphs and its speed relative to the reference.
+
+Exits with status 1 if anything differs.
+"""
+import argparse
+import difflib
+import importlib
+import inspect
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cleaner import clean_structure
+from epub_writer import ChapterBuilder
+from fused import fused_clean_and_merge
+from incremental import convert_incremental, sidecar_dir
+from merger import merge_paragraphs
+from parallel import iter_parallel_paragraphs
+from pipeline import iter_streaming_paragraphs
+from text_encoding import read_text
+
+GOLDEN_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(GOLDEN_DIR, "corpus")
+EXPECTED_DIR = os.path.join(GOLDEN_DIR, "expected")
+
+# Small enough that the synthetic corpus files are split into several chapter files
+GOLDEN_CHAPTER_SIZE = 8_000
+
+# Paragraphs of context shown around the first difference
+DIFF_CONTEXT = 2
+
+# Workers for the parallel engine; it is given its own pool so even the
+# small corpus files are cut into segments.
+PARALLEL_WORKERS = 2
+
+# The parallel engine's pool, started on first use and shut down by main()
+_parallel_pool = None
+
+
+def reference_engine(text, path):
+    return merge_paragraphs(clean_structure(text))
+
+
+def fused_engine(text, path):
+    return fused_clean_and_merge(text)
+
+
+def parallel_engine(text, path):
+    # One pool for the whole run; starting processes per file would swamp the timings
+    global _parallel_pool
+    if _parallel_pool is None:
+        _parallel_pool = ProcessPoolExecutor(max_workers=PARALLEL_WORKERS)
+    return "\n\n".join(iter_parallel_paragraphs(text, PARALLEL_WORKERS, _parallel_pool))
+
+
+def shutdown_parallel_pool():
+    global _parallel_pool
+    if _parallel_pool is not None:
+        _parallel_pool.shutdown()
+        _parallel_pool = None
+
+
+def streaming_engine(text, path):
+    # What convert_file_streaming feeds the EPUB writer
+    return "\n\n".join(iter_streaming_paragraphs(path))
+
+
+def incremental_engine(text, path):
+    # A cold convert_incremental run; the merged text of each part is read back from its cache
+    out_dir = tempfile.mkdtemp(prefix="golden_incremental_")
+    try:
+        output_path = os.path.join(out_dir, "book.epub")
+        convert_incremental(text, output_path, "Golden", "Golden")
+        cache_dir = sidecar_dir(output_path)
+        with open(os.path.join(cache_dir, "manifest.json"), "r", encoding="utf-8") as f:
+            keys = json.load(f)["parts"]
+        merged = []
+        for key in keys:
+            with open(os.path.join(cache_dir, key + ".json"), "r", encoding="utf-8") as f:
+                part = json.load(f)["merged"]
+            if part:
+                merged.append(part)
+        return "\n\n".join(merged)
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+ENGINES = {
+    "fused": fused_engine,
+    "parallel": parallel_engine,
+    "streaming": streaming_engine,
+    "incremental": incremental_engine,
+}
+
+
+def load_engine(spec):
+    """
+    An engine by name, or any function given as "module:function".
+
+    Engines take (text, path) and return the merged text, or an iterable of
+    paragraphs. A function that can be called with the text alone (e.g.
+    fused_clean_and_merge, whose second argument is optional) gets only the text.
+    """
+    if spec in ENGINES:
+        return ENGINES[spec]
+    module_name, _, function_name = spec.partition(":")
+    if not function_name:
+        raise SystemExit(f"Unknown engine {spec!r}; use one of {', '.join(ENGINES)} or module:function")
+    func = getattr(importlib.import_module(module_name), function_name)
+
+    # Decided once from the signature; retrying on TypeError would run the
+    # engine twice and hide TypeErrors raised inside it.
+    try:
+        inspect.signature(func).bind("")
+        takes_path = False
+    except TypeError:
+        takes_path = True
+
+    def engine(text, path):
+        result = func(text, path) if takes_path else func(text)
+        return result if isinstance(result, str) else "\n\n".join(result)
+    return engine
+
+
+def render_chapters(merged):
+    """
+    The chapters create_epub would write for this merged text, as one
+    reviewable document: each chapter's file name and title, its body,
+    then the TOC.
+    """
+    builder = ChapterBuilder("Golden", GOLDEN_CHAPTER_SIZE)
+    parts = []
+    for chapter in builder.iter_chapters(merged.split("\n\n")):
+        parts.append(f"=== {chapter.file_name} | {chapter.title}\n{chapter.body}")
+    parts.append("=== toc\n")
+
+    def dump(entries, depth):
+        for entry in entries:
+            parts.append(f"{'  ' * depth}{entry.title} -> {entry.href}\n")
+            dump(entry.children, depth + 1)
+    dump(builder.toc, 0)
+    return "".join(parts)
+
+
+def load_corpus():
+    """(name, path, text) per corpus file, sorted by name."""
+    corpus = []
+    for file_name in sorted(os.listdir(CORPUS_DIR)):
+        if file_name.endswith(".txt"):
+            path = os.path.join(CORPUS_DIR, file_name)
+            text, _ = read_text(path)
+            corpus.append((os.path.splitext(file_name)[0], path, text))
+    return corpus
+
+
+def _expected_paths(name):
+    return (os.path.join(EXPECTED_DIR, name + ".merged.txt"),
+            os.path.join(EXPECTED_DIR, name + ".chapters.txt"))
+
+
+def _read(path):
+    try:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write(text)
+
+
+def first_difference(expected, actual, context=DIFF_CONTEXT):
+    """A short unified diff of the paragraphs around the first difference, or None if equal."""
+    if expected == actual:
+        return None
+    a = expected.split("\n\n")
+    b = actual.split("\n\n")
+    diff = difflib.unified_diff(a, b, "expected", "actual", n=context, lineterm="")
+    lines = []
+    for line in diff:
+        if line.startswith("@@") and len(lines) > 2:
+            break # First hunk only
+        lines.append(line if len(line) <= 160 else line[:157] + "...")
+    return "\n".join(lines) + f"\n({len(a)} expected paragraphs, {len(b)} actual)"
+
+
+def time_call(func, *args, repeat=1):
+    """(result, best seconds) over repeat runs."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def check_goldens(corpus, update=False):
+    """Compares the reference output with golden/expected (or rewrites it). Returns the failure count."""
+    os.makedirs(EXPECTED_DIR, exist_ok=True)
+    failures = 0
+    for name, path, text in corpus:
+        merged = reference_engine(text, path)
+        outputs = (merged, render_chapters(merged))
+        for expected_path, output in zip(_expected_paths(name), outputs):
+            label = os.path.relpath(expected_path, GOLDEN_DIR)
+            if update:
+                _write(expected_path, output)
+                print(f"WROTE {label}")
+                continue
+            expected = _read(expected_path)
+            if expected is None:
+                failures += 1
+                print(f"MISS  {label} (run with --update to create it)")
+            elif expected != output:
+                failures += 1
+                print(f"DIFF  {label}")
+                print(_indent(first_difference(expected, output)))
+            else:
+                print(f"OK    {label}")
+    return failures
+
+
+def compare_engines(cases, engines, repeat=1):
+    """
+    Runs each engine on each case and compares it with the reference.
+
+    Args:
+        cases (list): (name, path, text) tuples.
+        engines (dict): name -> engine function.
+        repeat (int): Timed runs per engine; the best is used for the speed ratio.
+
+    Returns:
+        int: Number of (case, engine) pairs whose output differs.
+    """
+    failures = 0
+    for name, path, text in cases:
+        expected, reference_seconds = time_call(reference_engine, text, path, repeat=repeat)
+        print(f"{name} ({len(text):,} chars, reference {reference_seconds * 1000:.1f} ms)")
+        for engine_name, engine in engines.items():
+            actual, seconds = time_call(engine, text, path, repeat=repeat)
+            ratio = reference_seconds / seconds if seconds else float("inf")
+            difference = first_difference(expected, actual)
+            status = "OK  " if difference is None else "DIFF"
+            print(f"  {status}  {engine_name:<14}{seconds * 1000:10.1f} ms  {ratio:6.2f}x vs reference")
+            if difference is not None:
+                failures += 1
+                print(_indent(difference, "        "))
+    return failures
+
+
+def _indent(text, prefix="      "):
+    return "\n".join(prefix + line for line in text.splitlines())
+
+
+def _synthetic_cases(size_mb, out_dir):
+    # Written to out_dir because the streaming engine reads its input from disk
+    from benchmarks.synthetic import generate_book
+
+    cases = []
+    for language, blank_lines in (("mixed", True), ("korean", True), ("english", False)):
+        name = f"synthetic_{language}{'' if blank_lines else '_no_blank'}_{size_mb:g}mb"
+        text = generate_book(int(size_mb * 1024 * 1024), seed=0, language=language, blank_lines=blank_lines).text
+        path = os.path.join(out_dir, name + ".txt")
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            f.write(text)
+        cases.append((name, path, text))
+    return cases
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the golden outputs and compare engines with the reference.")
+    parser.add_argument("--engine", action="append",
+                        help=f"Engine to compare (repeatable): {', '.join(ENGINES)} or module:function (default: all)")
+    parser.add_argument("--update", action="store_true", help="Rewrite golden/expected from the reference")
+    parser.add_argument("--synthetic-mb", type=float, help="Also compare on generated books of this size")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per engine; the best is reported")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus()
+    failures = check_goldens(corpus, update=args.update)
+    if args.update:
+        return 0
+
+    engines = {spec: load_engine(spec) for spec in (args.engine or ENGINES)}
+    with tempfile.TemporaryDirectory(prefix="golden_synthetic_") as synthetic_dir:
+        cases = corpus + (_synthetic_cases(args.synthetic_mb, synthetic_dir) if args.synthetic_mb else [])
+        print()
+        try:
+            failures += compare_engines(cases, engines, args.repeat)
+        finally:
+            shutdown_parallel_pool()
+
+    print(f"\n{failures} difference(s)" if failures else "\nAll outputs match.")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
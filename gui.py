@@ -0,0 +1,511 @@
+import os
+import queue
+import threading
+import traceback
+import customtkinter as ctk
+from tkinter import filedialog, messagebox
+from ai_cleaner import (CHUNK_TOKENS, GENERATION_CONFIG, MODEL_NAME, SYSTEM_INSTRUCTION, ConversionCancelled,
+                        clean_planned_chunks, clean_text_with_ai)
+from ai_cache import ChunkCache, chunk_key
+from fused import iter_fused_paragraphs
+from hybrid import clean_text_hybrid
+from epub_writer import create_epub
+from pipeline import convert_file_streaming
+from instrument import ThroughputMeter, Tracer, format_duration
+from incremental import convert_incremental
+from parallel import iter_parallel_paragraphs
+from text_encoding import detect_encoding, read_text
+# Configuration for custom tkinter
+ctk.set_appearance_mode("System")
+ctk.set_default_color_theme("blue")
+
+# How often the Tk thread drains the worker's event queue (ms)
+EVENT_POLL_MS = 50
+
+# Events handled per poll at most, so a burst of log lines cannot freeze the window
+EVENT_BATCH = 200
+
+
+class QueueRow:
+    """One file in the queue panel: its name, a progress bar and a status/ETA label."""
+
+    def __init__(self, parent, row, input_path):
+        self.input_path = input_path
+        self.label = ctk.CTkLabel(parent, text=os.path.basename(input_path), anchor="w")
+        self.label.grid(row=row, column=0, padx=(5, 10), pady=2, sticky="ew")
+        self.progressbar = ctk.CTkProgressBar(parent, width=120)
+        self.progressbar.grid(row=row, column=1, padx=5, pady=2)
+        self.progressbar.set(0)
+        self.status = ctk.CTkLabel(parent, text="Waiting", width=170, anchor="w")
+        self.status.grid(row=row, column=2, padx=5, pady=2, sticky="w")
+
+    def update(self, progress=None, status=None):
+        # Tk thread only; workers go through TextToEpubApp.post
+        if progress is not None:
+            self.progressbar.set(progress)
+        if status is not None:
+            self.status.configure(text=status)
+
+    def destroy(self):
+        for widget in (self.label, self.progressbar, self.status):
+            widget.destroy()
+
+
+class TextToEpubApp(ctk.CTk):
+    def __init__(self):
+        super().__init__()
+
+        self.title("Text to EPUB Converter")
+        self.geometry("600x940") # Increased height for the queue panel
+
+        # Tk is not thread-safe: the conversion thread never touches widgets itself,
+        # it posts (function, args) here and poll_events runs them on the Tk thread.
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.input_paths = []
+        self.queue_rows = []
+        self.current_job = None # (QueueRow, file index, file count); worker thread only
+        # AI chunks per second, measured across files for the ETA
+        self.chunk_meter = ThroughputMeter()
+
+        # Layout configuration
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(7, weight=1) # Log area expands (index shifted)
+
+        # Input File Selection
+        self.input_file_path = ctk.StringVar()
+        self.btn_browse_input = ctk.CTkButton(self, text="Select Input Text File(s)", command=self.browse_input)
+        self.btn_browse_input.grid(row=0, column=0, padx=20, pady=(20, 10), sticky="ew")
+        
+        self.lbl_input_path = ctk.CTkLabel(self, textvariable=self.input_file_path, text_color="gray")
+        self.lbl_input_path.grid(row=1, column=0, padx=20, pady=(0, 10), sticky="ew")
+
+        # Metadata Inputs
+        self.frame_meta = ctk.CTkFrame(self)
+        self.frame_meta.grid(row=2, column=0, padx=20, pady=10, sticky="ew")
+        self.frame_meta.grid_columnconfigure(1, weight=1)
+
+        ctk.CTkLabel(self.frame_meta, text="Title:").grid(row=0, column=0, padx=10, pady=10)
+        self.entry_title = ctk.CTkEntry(self.frame_meta, placeholder_text="Book Title")
+        self.entry_title.grid(row=0, column=1, padx=10, pady=10, sticky="ew")
+
+        ctk.CTkLabel(self.frame_meta, text="Author:").grid(row=1, column=0, padx=10, pady=10)
+        self.entry_author = ctk.CTkEntry(self.frame_meta, placeholder_text="Author Name")
+        self.entry_author.grid(row=1, column=1, padx=10, pady=10, sticky="ew")
+
+        self.streaming_var = ctk.BooleanVar(value=False)
+        self.chk_streaming = ctk.CTkCheckBox(self.frame_meta, text="Low-memory streaming mode (large files, ignored with AI)", variable=self.streaming_var)
+        self.chk_streaming.grid(row=2, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+
+        self.trace_var = ctk.BooleanVar(value=False)
+        self.chk_trace = ctk.CTkCheckBox(self.frame_meta, text="Write timing/memory trace (JSON, slower)", variable=self.trace_var)
+        self.chk_trace.grid(row=3, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+
+        self.incremental_var = ctk.BooleanVar(value=False)
+        self.chk_incremental = ctk.CTkCheckBox(self.frame_meta, text="Incremental rebuild (only reprocess changed chapters)", variable=self.incremental_var)
+        self.chk_incremental.grid(row=4, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+
+        self.periodic_var = ctk.BooleanVar(value=False)
+        self.chk_periodic = ctk.CTkCheckBox(self.frame_meta, text="Find running headers by repetition (books without page numbers)", variable=self.periodic_var)
+        self.chk_periodic.grid(row=5, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+
+        self.parallel_var = ctk.BooleanVar(value=False)
+        self.chk_parallel = ctk.CTkCheckBox(self.frame_meta, text="Clean on all CPU cores (very large files, no AI)", variable=self.parallel_var)
+        self.chk_parallel.grid(row=6, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+
+        # AI Configuration
+        self.frame_ai = ctk.CTkFrame(self)
+        self.frame_ai.grid(row=3, column=0, padx=20, pady=10, sticky="ew")
+        self.frame_ai.grid_columnconfigure(1, weight=1)
+
+        self.env_api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+        
+        self.use_ai_var = ctk.BooleanVar(value=False)
+        self.chk_use_ai = ctk.CTkCheckBox(self.frame_ai, text="Use AI for Cleaning (Experimental)", variable=self.use_ai_var, command=self.toggle_ai_options)
+        self.chk_use_ai.grid(row=0, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+        
+        ctk.CTkLabel(self.frame_ai, text="Gemini API Key:").grid(row=1, column=0, padx=10, pady=10)
+        self.entry_api_key = ctk.CTkEntry(self.frame_ai, placeholder_text="AIzaSy...", show="*")
+        self.entry_api_key.grid(row=1, column=1, padx=10, pady=10, sticky="ew")
+        self.entry_api_key.configure(state="disabled") # Disabled by default
+        if self.env_api_key:
+            self.entry_api_key.configure(state="normal")
+            self.entry_api_key.insert(0, self.env_api_key)
+            self.entry_api_key.configure(state="disabled")
+
+        self.hybrid_var = ctk.BooleanVar(value=False)
+        self.chk_hybrid = ctk.CTkCheckBox(self.frame_ai, text="Hybrid: only send ambiguous pages to AI", variable=self.hybrid_var)
+        self.chk_hybrid.grid(row=2, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+        self.chk_hybrid.configure(state="disabled")
+
+        # Convert / Cancel Buttons
+        self.frame_buttons = ctk.CTkFrame(self, fg_color="transparent")
+        self.frame_buttons.grid(row=4, column=0, padx=20, pady=20, sticky="ew")
+        self.frame_buttons.grid_columnconfigure(0, weight=1)
+
+        self.btn_convert = ctk.CTkButton(self.frame_buttons, text="Convert to EPUB", command=self.start_conversion)
+        self.btn_convert.grid(row=0, column=0, sticky="ew")
+
+        self.btn_cancel = ctk.CTkButton(self.frame_buttons, text="Cancel", width=100, command=self.cancel_conversion)
+        self.btn_cancel.grid(row=0, column=1, padx=(10, 0))
+        self.btn_cancel.configure(state="disabled")
+
+        # Progress / Status (whole queue)
+        self.progressbar = ctk.CTkProgressBar(self)
+        self.progressbar.grid(row=5, column=0, padx=20, pady=(0, 10), sticky="ew")
+        self.progressbar.set(0)
+
+        # Queue: one row per selected file
+        self.frame_queue = ctk.CTkScrollableFrame(self, height=100, label_text="Queue")
+        self.frame_queue.grid(row=6, column=0, padx=20, pady=(0, 10), sticky="ew")
+        self.frame_queue.grid_columnconfigure(0, weight=1)
+
+        self.textbox_log = ctk.CTkTextbox(self, height=150)
+        self.textbox_log.grid(row=7, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        self.textbox_log.insert("0.0", "Welcome! Select a file to start.\n")
+
+        self.after(EVENT_POLL_MS, self.poll_events)
+
+    def toggle_ai_options(self):
+        state = "normal" if self.use_ai_var.get() else "disabled"
+        self.entry_api_key.configure(state=state)
+        self.chk_hybrid.configure(state=state)
+        if state == "normal" and not self.entry_api_key.get() and self.env_api_key:
+            self.entry_api_key.insert(0, self.env_api_key)
+
+    def post(self, func, *args):
+        """Runs func(*args) on the Tk thread. Safe to call from any thread."""
+        self.events.put((func, args))
+
+    def poll_events(self):
+        try:
+            for _ in range(EVENT_BATCH):
+                try:
+                    func, args = self.events.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    func(*args)
+                except Exception:
+                    # A failing update must not stop the ones queued behind it
+                    traceback.print_exc()
+        finally:
+            # Always poll again, or every later log line and progress update would be lost
+            self.after(EVENT_POLL_MS, self.poll_events)
+
+    def log(self, message):
+        self.post(self._append_log, message)
+
+    def _append_log(self, message):
+        self.textbox_log.insert("end", message + "\n")
+        self.textbox_log.see("end")
+
+    def set_progress(self, value):
+        # Worker thread: progress of the current file, 0.0 to 1.0
+        row, index, count = self.current_job
+        self.post(self._show_progress, row, index, count, value)
+
+    def _show_progress(self, row, index, count, value):
+        row.update(progress=value)
+        self.progressbar.set((index + value) / count)
+
+    def browse_input(self):
+        filenames = filedialog.askopenfilenames(filetypes=[("Text Files", "*.txt")])
+        if filenames:
+            self.set_input_paths(list(filenames))
+            # Auto-fill title from filename if empty (several files are titled after their own names)
+            if len(filenames) == 1 and not self.entry_title.get():
+                basename = os.path.basename(filenames[0])
+                self.entry_title.insert(0, os.path.splitext(basename)[0])
+
+    def set_input_paths(self, paths):
+        self.input_paths = paths
+        if len(paths) == 1:
+            self.input_file_path.set(paths[0])
+        else:
+            self.input_file_path.set(f"{len(paths)} files selected (each book is titled after its file name)")
+        for row in self.queue_rows:
+            row.destroy()
+        self.queue_rows = [QueueRow(self.frame_queue, i, path) for i, path in enumerate(paths)]
+
+    def cancel_conversion(self):
+        self.cancel_event.set()
+        self.btn_cancel.configure(state="disabled")
+        self.log("Cancelling: no new AI requests are sent; waiting for the ones in flight...")
+
+    def start_conversion(self):
+        input_paths = self.input_paths
+        title = self.entry_title.get()
+        author = self.entry_author.get()
+        use_ai = self.use_ai_var.get()
+        hybrid = use_ai and self.hybrid_var.get()
+        periodic_headers = self.periodic_var.get()
+        parallel = self.parallel_var.get()
+        streaming = self.streaming_var.get() and not use_ai
+        write_trace = self.trace_var.get()
+        incremental = self.incremental_var.get() and not streaming
+        api_key = self.entry_api_key.get() or self.env_api_key
+
+        if not input_paths:
+            messagebox.showerror("Error", "Please select an input file.")
+            return
+        
+        if use_ai and not api_key:
+            messagebox.showerror("Error", "API Key is required for AI cleaning.")
+            return
+        
+        if not title:
+            title = "Untitled"
+        if not author:
+            author = "Unknown"
+
+        if len(input_paths) == 1:
+            jobs = [(input_paths[0], title)]
+        else:
+            jobs = [(path, os.path.splitext(os.path.basename(path))[0] or "Untitled") for path in input_paths]
+
+        self.cancel_event = threading.Event()
+        self.btn_convert.configure(state="disabled")
+        self.btn_browse_input.configure(state="disabled") # The queue rows stay until the run is over
+        self.btn_cancel.configure(state="normal")
+        self.progressbar.set(0)
+        for row in self.queue_rows:
+            row.update(0, "Waiting")
+        self.log("Starting conversion...")
+
+        settings = (use_ai, api_key, streaming, write_trace, incremental, hybrid, periodic_headers, parallel)
+        # Run in separate thread to keep UI responsive
+        threading.Thread(target=self.run_queue, args=(jobs, list(self.queue_rows), author, settings, self.cancel_event),
+                         daemon=True).start()
+
+    def run_queue(self, jobs, rows, author, settings, cancel_event):
+        """Converts the queued files one after another (worker thread)."""
+        converted = []
+        failed = []
+        cancelled = False
+        unstarted = len(jobs) # Index of the first file never started
+        for index, ((input_path, title), row) in enumerate(zip(jobs, rows)):
+            if cancel_event.is_set():
+                cancelled = True
+                unstarted = index
+                break
+            self.current_job = (row, index, len(jobs))
+            self.post(row.update, 0, "Running")
+            try:
+                output_path = self.run_conversion(input_path, title, author, *settings, cancel_event=cancel_event)
+                converted.append(output_path)
+                self.set_progress(1.0)
+                self.post(row.update, None, "Done")
+            except ConversionCancelled:
+                cancelled = True
+                unstarted = index + 1
+                self.post(row.update, None, "Cancelled")
+                break
+            except Exception as e:
+                failed.append((input_path, e))
+                self.log(f"Error: {str(e)}")
+                self.post(row.update, None, "Failed")
+
+        for row in rows[unstarted:]:
+            self.post(row.update, None, "Skipped")
+        self.post(self.finish_queue, converted, failed, cancelled)
+
+    def finish_queue(self, converted, failed, cancelled):
+        self.btn_convert.configure(state="normal")
+        self.btn_browse_input.configure(state="normal")
+        self.btn_cancel.configure(state="disabled")
+        if cancelled:
+            self.log("Cancelled.")
+            messagebox.showinfo("Cancelled", f"Conversion cancelled.\n{len(converted)} file(s) were converted before that.")
+        elif failed and not converted and len(failed) == 1:
+            messagebox.showerror("Error", f"An error occurred:\n{str(failed[0][1])}")
+        elif failed:
+            names = "\n".join(os.path.basename(path) for path, _ in failed)
+            messagebox.showwarning("Finished with errors", f"Converted {len(converted)} file(s); {len(failed)} failed:\n{names}")
+        elif len(converted) == 1:
+            messagebox.showinfo("Success", f"Converted successfully!\nFile saved at: {converted[0]}")
+        else:
+            messagebox.showinfo("Success", f"Converted {len(converted)} files successfully!")
+
+    def make_chunk_callback(self):
+        """
+        Returns a chunk_callback(done, total) for one AI run that shows the
+        chunk count and an ETA in the current file's queue row.
+        """
+        row = self.current_job[0]
+        meter = self.chunk_meter
+        last_done = [None]
+
+        def chunk_cb(done, total):
+            if last_done[0] is None:
+                # First call: chunks already done (journal) are not timed
+                meter.start()
+            else:
+                meter.add(done - last_done[0])
+            last_done[0] = done
+            eta = meter.eta(total - done)
+            status = f"AI {done}/{total}"
+            if eta is not None and done < total:
+                status += f", ~{format_duration(eta)} left"
+            self.post(row.update, None, status)
+
+        return chunk_cb
+
+    def check_cancelled(self, cancel_event):
+        if cancel_event.is_set():
+            raise ConversionCancelled("Cancelled")
+
+    def run_conversion(self, input_path, title, author, use_ai, api_key, streaming=False, write_trace=False,
+                       incremental=False, hybrid=False, periodic_headers=False, parallel=False, cancel_event=None):
+        """
+        Converts one file (worker thread) and returns the EPUB path.
+
+        Raises ConversionCancelled if cancel_event is set: AI requests stop
+        being sent at once, other stages stop at the next stage boundary.
+        """
+        cancel_event = cancel_event or threading.Event()
+        tracer = Tracer(trace_memory=write_trace)
+        try:
+            output_path = os.path.splitext(input_path)[0] + ".epub"
+
+            if streaming:
+                self.log(f"Streaming {input_path} (cleaning, merging and writing chapters as they are produced)...")
+                self.set_progress(0.3)
+                with tracer.stage("streaming", os.path.getsize(input_path)):
+                    encoding_info = convert_file_streaming(input_path, output_path, title, author)
+                self.log(f"Detected encoding: {encoding_info} ({encoding_info.seconds * 1000:.1f} ms)")
+                self.set_progress(1.0)
+                self.log_trace(tracer, output_path, write_trace)
+                self.log(f"Success! Saved to {output_path}")
+                return output_path
+
+            self.log(f"Reading {input_path}...")
+            self.set_progress(0.1)
+            
+            with tracer.stage("detect_encoding"):
+                encoding_info = detect_encoding(input_path)
+            self.log(f"Detected encoding: {encoding_info} ({encoding_info.seconds * 1000:.1f} ms)")
+
+            with tracer.stage("read", os.path.getsize(input_path)) as rec:
+                raw_text, _ = read_text(input_path, encoding_info)
+                rec.output_size = len(raw_text)
+            self.check_cancelled(cancel_event)
+
+            if incremental:
+                self.log("Incremental rebuild: reprocessing changed chapters only...")
+                self.set_progress(0.3)
+                ai_clean = None
+                ai_signature = ""
+                cache = None
+                if use_ai:
+                    cache = ChunkCache()
+                    ai_signature = chunk_key("", MODEL_NAME, SYSTEM_INSTRUCTION, GENERATION_CONFIG)
+
+                    def ai_clean(chapter_text):
+                        return clean_text_with_ai(chapter_text, api_key, cache=cache, log_callback=self.log, tracer=tracer,
+                                                  cancel_event=cancel_event, chunk_callback=self.make_chunk_callback())
+
+                with tracer.stage("incremental", len(raw_text)):
+                    convert_incremental(raw_text, output_path, title, author, ai_clean, ai_signature,
+                                        log_callback=self.log)
+                if cache is not None:
+                    # Only rebuilt chapters reach the AI, so hits here are chunks whose text did not change
+                    self.log(cache.stats_line())
+                self.set_progress(1.0)
+                self.log_trace(tracer, output_path, write_trace)
+                self.log(f"Success! Saved to {output_path}")
+                return output_path
+
+            final_text = ""
+
+            if use_ai:
+                self.log("AI Cleaning started. This may take a while depending on file size...")
+                self.set_progress(0.2)
+
+                def progress_cb(val):
+                    # Called from the AI pool; set_progress only queues the update
+                    self.set_progress(val)
+
+                cache = ChunkCache()
+                try:
+                    journal_path = os.path.splitext(input_path)[0] + ".ai-journal.jsonl"
+                    if hybrid:
+                        def clean_chunks(chunks):
+                            return clean_planned_chunks(chunks, api_key, progress_callback=progress_cb, cache=cache,
+                                                        journal_path=journal_path, log_callback=self.log, tracer=tracer,
+                                                        cancel_event=cancel_event,
+                                                        chunk_callback=self.make_chunk_callback())
+
+                        with tracer.stage("clean_text_hybrid", len(raw_text)) as rec:
+                            final_text = clean_text_hybrid(raw_text, clean_chunks, CHUNK_TOKENS, log_callback=self.log,
+                                                           periodic_headers=periodic_headers)
+                            rec.output_size = sum(len(p) for p in final_text)
+                    else:
+                        with tracer.stage("clean_text_with_ai", len(raw_text)) as rec:
+                            final_text = clean_text_with_ai(raw_text, api_key, progress_callback=progress_cb, cache=cache,
+                                                            journal_path=journal_path, log_callback=self.log, tracer=tracer,
+                                                            cancel_event=cancel_event,
+                                                            chunk_callback=self.make_chunk_callback())
+                            rec.output_size = len(final_text)
+                    self.log("AI Cleaning completed.")
+                    self.log(cache.stats_line())
+                except ConversionCancelled:
+                    raise
+                except Exception as e:
+                    self.log(f"AI Error: {str(e)}")
+                    self.log("Falling back to standard cleaning...")
+                    # Fallback
+                    final_text = self.run_heuristic_stages(raw_text, tracer, periodic_headers, parallel)
+            else:
+                self.log("Cleaning structure (removing page numbers, headers) and merging paragraphs...")
+                self.set_progress(0.3)
+                final_text = self.run_heuristic_stages(raw_text, tracer, periodic_headers, parallel)
+
+            self.check_cancelled(cancel_event)
+            self.log("Creating EPUB structure...")
+            self.set_progress(0.9)
+            
+            # final_text is the AI's merged text or the fused engine's paragraph list
+            text_size = len(final_text) if isinstance(final_text, str) else sum(len(p) for p in final_text)
+            with tracer.stage("create_epub", text_size):
+                self.create_epub(final_text, output_path, title, author)
+
+            self.set_progress(1.0)
+            self.log_trace(tracer, output_path, write_trace)
+            self.log(f"Success! Saved to {output_path}")
+            return output_path
+
+        finally:
+            tracer.close()
+
+    def run_heuristic_stages(self, raw_text, tracer, periodic_headers=False, parallel=False):
+        # Cleaning and merging run as one fused pass (or split across processes);
+        # the paragraph list goes to create_epub as is.
+        with tracer.stage("clean_merge", len(raw_text)) as rec:
+            if parallel and not periodic_headers:
+                paragraphs = list(iter_parallel_paragraphs(raw_text))
+            else:
+                paragraphs = list(iter_fused_paragraphs(raw_text.splitlines(), periodic_headers))
+            rec.output_size = sum(len(p) for p in paragraphs)
+        self.set_progress(0.5)
+        return paragraphs
+
+    def log_trace(self, tracer, output_path, write_trace):
+        self.log("Stage timings:")
+        for line in tracer.summary_lines():
+            self.log(line)
+        if write_trace:
+            trace_path = os.path.splitext(output_path)[0] + ".trace.json"
+            tracer.write_json(trace_path)
+            self.log(f"Trace written to {trace_path}")
+
+    def create_epub(self, text, output_path, title, author):
+        create_epub(text, output_path, title, author)
+
+def run():
+    app = TextToEpubApp()
+    app.mainloop()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,145 @@
+import re
+from merger import TERMINATORS
+
+# Running headers are short
+HEADER_MAX_LENGTH = 80
+
+# A shape must repeat at least this often to be considered
+MIN_REPEATS = 5
+
+# Repeats closer than this many lines are body text, not page furniture
+MIN_PERIOD = 8
+
+# How far a gap may stray from a multiple of the period, as a share of the period
+PERIOD_TOLERANCE = 0.15
+
+# Pages in a row that may lack the header (e.g. chapter openings)
+MAX_SKIPPED_PAGES = 3
+
+# Share of gaps that must fit the period
+MIN_PERIODIC_FRACTION = 0.75
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+DIGITS_PATTERN = re.compile(r'\d+')
+DIGIT_PATTERN = re.compile(r'\d')
+
+# Shapes made only of these are page numbers, which cleaner handles itself
+PAGE_NUMBER_CHARS = set("#-[]. ")
+
+
+def line_shape(stripped):
+    """
+    Normalized form of a line: whitespace collapsed and numbers masked.
+
+    "12  The Fox and Hound" and "13 The Fox and Hound" share the shape
+    "# The Fox and Hound".
+    """
+    return DIGITS_PATTERN.sub("#", WHITESPACE_PATTERN.sub(" ", stripped))
+
+
+def build_shape_index(lines):
+    """
+    Maps each candidate header shape to the line indices it occurs at.
+
+    Candidates are short non-blank lines that do not end like a sentence and
+    are not bare page numbers.
+
+    Args:
+        lines (list): Raw lines.
+
+    Returns:
+        dict: shape -> list of line indices, ascending.
+    """
+    index = {}
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if not stripped or len(stripped) > HEADER_MAX_LENGTH or stripped.endswith(TERMINATORS):
+            continue
+        if DIGIT_PATTERN.search(stripped) is None and "  " not in stripped and "\t" not in stripped:
+            # Most lines: nothing to mask or collapse
+            shape = stripped
+        else:
+            shape = line_shape(stripped)
+            if set(shape) <= PAGE_NUMBER_CHARS:
+                continue
+        positions = index.get(shape)
+        if positions is None:
+            index[shape] = [i]
+        else:
+            positions.append(i)
+    return index
+
+
+def _fits(gap, period, tolerance):
+    pages = round(gap / period)
+    return 1 <= pages <= MAX_SKIPPED_PAGES and abs(gap - pages * period) <= tolerance * pages
+
+
+def find_period(positions):
+    """
+    Period (in lines) of a series of positions, or None if it is not periodic.
+
+    The period is the median gap between consecutive positions; the series
+    is periodic if most gaps are close to a small multiple of it. Headers on
+    every page, or on every other page (alternating even/odd headers), both
+    pass; a line that merely recurs in the text does not.
+    """
+    if len(positions) < MIN_REPEATS:
+        return None
+    gaps = sorted(b - a for a, b in zip(positions, positions[1:]))
+    period = gaps[len(gaps) // 2]
+    if period < MIN_PERIOD:
+        return None
+    tolerance = max(2, period * PERIOD_TOLERANCE)
+    fitting = sum(1 for gap in gaps if _fits(gap, period, tolerance))
+    if fitting < MIN_PERIODIC_FRACTION * len(gaps):
+        return None
+    return period
+
+
+def find_periodic_headers(lines):
+    """
+    Finds running headers/footers by how regularly they repeat.
+
+    Works without page numbers and catches headers that carry a changing
+    page number ("12 The Fox and Hound") or alternate between even and odd
+    pages. Each line shape's positions are indexed in one pass; shapes that
+    recur at a steady period are headers.
+
+    A book usually prints a chapter title as a heading before repeating it
+    as a running header, so the first occurrence of a line that recurs
+    verbatim is kept. Lines that differ every time (they carry the page
+    number) and later repeats are dropped where they fit the period; the
+    first line of the series is tested against the gap to the second.
+
+    Args:
+        lines (list): Raw lines.
+
+    Returns:
+        set: Indices of the lines to remove.
+    """
+    drop = set()
+    for positions in build_shape_index(lines).values():
+        period = find_period(positions)
+        if period is None:
+            continue
+        tolerance = max(2, period * PERIOD_TOLERANCE)
+
+        texts = [lines[i].strip() for i in positions]
+        counts = {}
+        for text in texts:
+            counts[text] = counts.get(text, 0) + 1
+        seen = {texts[0]}
+        if counts[texts[0]] == 1 and _fits(positions[1] - positions[0], period, tolerance):
+            # The first header carries its own page number, like the rest; it has no
+            # earlier occurrence, so test the gap to the next one instead.
+            drop.add(positions[0])
+
+        for k in range(1, len(positions)):
+            text = texts[k]
+            if counts[text] > 1 and text not in seen:
+                seen.add(text)
+                continue
+            if _fits(positions[k] - positions[k - 1], period, tolerance):
+                drop.add(positions[k])
+    return drop
@@ -0,0 +1,258 @@
+import re
+from cleaner import (HEADER_MIN_COUNT, PAGE_NUM_PATTERN, count_header_neighbors, find_repeating_headers, is_dropped_line,
+                     iter_clean_lines)
+from merger import TERMINATORS, closes_paragraph, detect_blank_lines, iter_merge_paragraphs
+from chunk_planner import estimate_tokens, join_chunk_outputs, plan_chunks
+from incremental import CHAPTER_START_PATTERN
+from header_detector import find_periodic_headers
+from ai_cleaner import ConversionCancelled
+
+# A line next to page numbers this often, but less than HEADER_MIN_COUNT
+# times, is probably a header the threshold just missed.
+NEAR_MISS_MIN_COUNT = 2
+
+# Surviving short lines with digits in them ("Page 12", "12 The Fox") are
+# usually page furniture the page number pattern did not catch.
+DIGIT_LINE_MAX_LENGTH = 40
+
+# Books without page numbers are cut into regions of about this many lines
+REGION_MAX_LINES = 120
+
+# Confident pages between two ambiguous ones that are sent along with them
+MERGE_GAP_PAGES = 2
+
+# How far a region boundary may move to land on a paragraph break
+BOUNDARY_SEARCH_LINES = 60
+
+DIGIT_PATTERN = re.compile(r'\d+')
+
+
+class Region:
+    """A page (or block of lines) of the raw text and why it looks ambiguous."""
+
+    def __init__(self, start, end):
+        self.start = start # First line index
+        self.end = end # One past the last line index
+        self.reasons = []
+
+    @property
+    def confident(self):
+        return not self.reasons
+
+
+def iter_region_bounds(lines):
+    """
+    Yields (start, end) line ranges, one per page.
+
+    A page ends after its page number line. Text without page numbers is cut
+    at the first blank line after REGION_MAX_LINES lines (or hard at twice
+    that).
+    """
+    start = 0
+    for i, line in enumerate(lines):
+        size = i + 1 - start
+        if (PAGE_NUM_PATTERN.match(line)
+                or (size >= REGION_MAX_LINES and not line.strip())
+                or size >= 2 * REGION_MAX_LINES):
+            yield start, i + 1
+            start = i + 1
+    if start < len(lines):
+        yield start, len(lines)
+
+
+def _shape(stripped):
+    """Line with its numbers masked, so "The Fox 12" and "The Fox 13" compare equal."""
+    return DIGIT_PATTERN.sub("#", stripped)
+
+
+def score_regions(lines, neighbor_counts, repeating_headers):
+    """
+    Splits the text into pages and flags the ones the heuristics may get wrong.
+
+    Only lines that survive clean_structure and do not end like a sentence
+    are looked at:
+    - lines next to page numbers that repeat, but fewer than HEADER_MIN_COUNT
+      times (exactly, or once their numbers are masked), i.e. headers the
+      threshold just missed;
+    - short lines with digits in them that are not chapter headings,
+      e.g. page furniture the page number pattern does not match.
+
+    Args:
+        lines (list): Raw lines.
+        neighbor_counts (dict): From cleaner.count_header_neighbors.
+        repeating_headers (set): From cleaner.find_repeating_headers.
+
+    Returns:
+        list: Region objects covering all lines, in order.
+    """
+    shape_counts = {}
+    for content, count in neighbor_counts.items():
+        shape = _shape(content)
+        shape_counts[shape] = shape_counts.get(shape, 0) + count
+
+    regions = []
+    for start, end in iter_region_bounds(lines):
+        region = Region(start, end)
+        for i in range(start, end):
+            line = lines[i]
+            stripped = line.strip()
+            if not stripped or is_dropped_line(line, stripped, repeating_headers):
+                continue
+
+            if stripped.endswith(TERMINATORS):
+                # Ends like a sentence: body text (e.g. a wrapped line's tail), not a header
+                continue
+
+            count = neighbor_counts.get(stripped, 0)
+            if NEAR_MISS_MIN_COUNT <= count < HEADER_MIN_COUNT:
+                region.reasons.append(f"near-miss header {stripped!r} ({count}x)")
+            elif count and shape_counts.get(_shape(stripped), 0) >= HEADER_MIN_COUNT and _shape(stripped) != stripped:
+                region.reasons.append(f"numbered header {stripped!r}")
+            elif (len(stripped) <= DIGIT_LINE_MAX_LENGTH and any(c.isdigit() for c in stripped)
+                  and not CHAPTER_START_PATTERN.match(stripped)):
+                region.reasons.append(f"short line with digits {stripped!r}")
+        regions.append(region)
+    return regions
+
+
+def _is_safe_split(lines, index, repeating_headers, has_blank_lines):
+    """
+    True if cleaning lines[:index] and lines[index:] separately merges the
+    same paragraphs as cleaning them together, i.e. the merger would end
+    its paragraph right before lines[index] anyway.
+    """
+    for i in range(index - 1, -1, -1):
+        line = lines[i]
+        stripped = line.strip()
+        if is_dropped_line(line, stripped, repeating_headers):
+            continue
+        # Last line the merger saw before the split
+        return closes_paragraph(stripped, has_blank_lines)
+    return True
+
+
+def plan_spans(lines, regions, repeating_headers, has_blank_lines):
+    """
+    Groups consecutive regions into spans of the same kind.
+
+    Ambiguous pages separated by only a few confident ones share a span,
+    since one larger AI request is cheaper than two. Low-confidence spans
+    then grow into their confident neighbours until both ends sit on
+    paragraph breaks, so no paragraph is cut in two between the AI and the
+    heuristic cleaner.
+
+    Returns:
+        list: (start, end, use_ai) tuples covering all lines, in order.
+    """
+    spans = [] # [start, end, use_ai, page count]
+    for region in regions:
+        use_ai = not region.confident
+        if spans and spans[-1][2] == use_ai:
+            spans[-1][1] = region.end
+            spans[-1][3] += 1
+        elif use_ai and len(spans) >= 2 and spans[-1][3] <= MERGE_GAP_PAGES:
+            # Swallow the short confident gap into the previous AI span
+            spans.pop()
+            spans[-1][1] = region.end
+            spans[-1][3] += 1
+        else:
+            spans.append([region.start, region.end, use_ai, 1])
+
+    for i, span in enumerate(spans):
+        if not span[2]:
+            continue
+        lower = spans[i - 1][0] if i > 0 else 0
+        upper = spans[i + 1][1] if i + 1 < len(spans) else len(lines)
+        start = span[0]
+        while start > lower and span[0] - start < BOUNDARY_SEARCH_LINES and not _is_safe_split(
+                lines, start, repeating_headers, has_blank_lines):
+            start -= 1
+        end = span[1]
+        while end < upper and end - span[1] < BOUNDARY_SEARCH_LINES and not _is_safe_split(
+                lines, end, repeating_headers, has_blank_lines):
+            end += 1
+        if _is_safe_split(lines, start, repeating_headers, has_blank_lines):
+            span[0] = start
+            if i > 0:
+                spans[i - 1][1] = start
+        if _is_safe_split(lines, end, repeating_headers, has_blank_lines):
+            span[1] = end
+            if i + 1 < len(spans):
+                spans[i + 1][0] = end
+
+    return [(start, end, use_ai) for start, end, use_ai, _ in spans if start < end]
+
+
+def clean_text_hybrid(raw_text, clean_chunks, chunk_tokens, log_callback=None, periodic_headers=False):
+    """
+    Cleans text heuristically and sends only ambiguous pages to the AI.
+
+    The whole book is scored page by page (see score_regions). Confident
+    pages go through clean_structure/merge_paragraphs with the book-wide
+    header statistics; the rest are planned into chunks and cleaned with
+    a single clean_chunks call, so they share one rate limit and worker
+    pool. If the AI fails, those pages fall back to the heuristics too;
+    a ConversionCancelled from clean_chunks is passed on instead.
+
+    Args:
+        raw_text (str): Raw text content.
+        clean_chunks (func): function(list of chunk texts) -> list of cleaned
+            texts, e.g. ai_cleaner.clean_planned_chunks with the key bound.
+        chunk_tokens (int): Estimated token budget per request.
+        log_callback (func): Optional callback for status messages.
+        periodic_headers (bool): Remove headers found by their period first
+            (see header_detector), so they do not make pages look ambiguous.
+
+    Returns:
+        list: Merged paragraphs, ready for create_epub.
+    """
+    lines = raw_text.splitlines()
+    if periodic_headers:
+        drop = find_periodic_headers(lines)
+        lines = [line for i, line in enumerate(lines) if i not in drop]
+    neighbor_counts = count_header_neighbors(lines)
+    repeating_headers = find_repeating_headers(neighbor_counts)
+    # Same paragraph mode merge_paragraphs(clean_structure(text)) would use
+    has_blank_lines = detect_blank_lines(iter_clean_lines(lines, repeating_headers))
+
+    regions = score_regions(lines, neighbor_counts, repeating_headers)
+    spans = plan_spans(lines, regions, repeating_headers, has_blank_lines)
+
+    ai_chunks = {}
+    chunks = []
+    for index, (start, end, use_ai) in enumerate(spans):
+        if use_ai:
+            span_chunks = plan_chunks("\n".join(lines[start:end]), chunk_tokens)
+            ai_chunks[index] = (len(chunks), len(span_chunks))
+            chunks.extend(span_chunks)
+
+    if log_callback:
+        unsure = sum(1 for region in regions if not region.confident)
+        full = len(plan_chunks(raw_text, chunk_tokens))
+        tokens = sum(estimate_tokens(chunk) for chunk in chunks)
+        log_callback(f"Hybrid: {unsure}/{len(regions)} page(s) look ambiguous; {len(chunks)} AI request(s) "
+                     f"(~{tokens:,} tokens) instead of {full} (~{estimate_tokens(raw_text):,} tokens).")
+
+    cleaned = None
+    if chunks:
+        try:
+            cleaned = clean_chunks(chunks)
+        except ConversionCancelled:
+            raise
+        except Exception as e:
+            if log_callback:
+                log_callback(f"AI Error: {e}; using standard cleaning for the ambiguous pages too.")
+    if cleaned is None:
+        # Nothing for the AI (or it failed): plain heuristic cleaning of the whole book
+        return list(iter_merge_paragraphs(iter_clean_lines(lines, repeating_headers), has_blank_lines))
+
+    paragraphs = []
+    for index, (start, end, use_ai) in enumerate(spans):
+        if use_ai:
+            first, count = ai_chunks[index]
+            merged = join_chunk_outputs(cleaned[first:first + count])
+            paragraphs.extend(p for p in merged.split("\n\n") if p.strip())
+        else:
+            paragraphs.extend(iter_merge_paragraphs(iter_clean_lines(lines[start:end], repeating_headers),
+                                                    has_blank_lines))
+    return paragraphs
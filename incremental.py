@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+from cleaner import count_header_neighbors, find_repeating_headers, is_dropped_line, iter_clean_lines
+from merger import detect_blank_lines, is_short_heading, iter_merge_paragraphs
+from epub_writer import CHAPTER_SIZE, Chapter, ChapterBuilder, TocEntry, create_epub_from_chapters
+from ai_cleaner import ConversionCancelled
+
+MANIFEST_VERSION = 2
+
+# A pack of source chapters may end early, once it holds this share of
+# pack_chars, after a chapter whose hash picks it as a boundary (one in
+# PACK_BOUNDARY_SPREAD). Boundaries then depend on the chapters around them
+# rather than on everything before, so an edit only re-packs its own pack.
+PACK_MIN_FRACTION = 0.5
+PACK_BOUNDARY_SPREAD = 4
+
+def sidecar_dir(output_path):
+    """Directory next to the EPUB holding the manifest and cached chapters."""
+    return output_path + ".cache"
+
+
+CHAPTER_START_PATTERN = re.compile(r'^(Chapter\s+\d+|제\s*\d+\s*장)', re.IGNORECASE)
+
+
+def split_source_chapters(lines, repeating_headers):
+    """
+    Splits raw lines into source chapters at chapter-start lines.
+
+    Only a chapter heading that survives clean_structure starts a chapter.
+    It is a short heading, so merge_paragraphs ends the paragraph before it
+    anyway and converting the chapters one by one gives exactly the same
+    paragraphs as converting the whole book at once. The same heading
+    removed as a running header is only a page header.
+
+    Returns:
+        list: One list of lines per source chapter.
+    """
+    chapters = [[]]
+    for line in lines:
+        stripped = line.strip()
+        if (chapters[-1] and CHAPTER_START_PATTERN.match(stripped) and is_short_heading(stripped)
+                and not is_dropped_line(line, stripped, repeating_headers)):
+            chapters.append([])
+        chapters[-1].append(line)
+    return chapters
+
+
+def pack_source_chapters(sources, keys, pack_chars):
+    """
+    Groups adjacent source chapters into packs of up to about pack_chars characters.
+
+    A pack is the unit that is cached, cleaned (one ai_clean call) and
+    rendered (one ChapterBuilder run), so a book with hundreds of short
+    chapters still gives a few requests and documents.
+
+    Args:
+        sources (list): Source text per chapter.
+        keys (list): Content hash per chapter.
+        pack_chars (int): Target characters per pack.
+
+    Returns:
+        list: Lists of chapter indices, one per pack.
+    """
+    packs = [[]]
+    size = 0
+    for index, (source, key) in enumerate(zip(sources, keys)):
+        if packs[-1] and size + len(source) > pack_chars:
+            packs.append([])
+            size = 0
+        packs[-1].append(index)
+        size += len(source) + 1
+        if size >= pack_chars * PACK_MIN_FRACTION and int(key[:8], 16) % PACK_BOUNDARY_SPREAD == 0:
+            packs.append([])
+            size = 0
+    return [pack for pack in packs if pack]
+
+
+def _hash(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _toc_to_json(entries):
+    return [{"title": e.title, "href": e.href, "children": _toc_to_json(e.children)} for e in entries]
+
+
+def _toc_from_json(items, prefix=""):
+    entries = []
+    for item in items:
+        entry = TocEntry(item["title"], prefix + item["href"])
+        entry.children = _toc_from_json(item["children"], prefix)
+        entries.append(entry)
+    return entries
+
+
+def _write_json_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def convert_incremental(raw_text, output_path, title, author, ai_clean=None, ai_signature="",
+                        chapter_size=CHAPTER_SIZE, log_callback=None, pack_chars=None):
+    """
+    Converts text to EPUB, rebuilding only the parts whose source changed.
+
+    The book is split into source chapters, and adjacent chapters are
+    grouped into packs (see pack_source_chapters). A sidecar directory
+    (<output>.cache) keeps a manifest plus, per pack, its merged text and
+    rendered XHTML, keyed by a hash of its chapters' source lines and of
+    everything else its output depends on (book-wide header statistics,
+    paragraph mode, title, AI settings). Unchanged packs are reused as-is
+    and the EPUB is reassembled from the cached XHTML.
+
+    Args:
+        raw_text (str): Raw text content.
+        output_path (str): Destination .epub path.
+        title (str): Book title.
+        author (str): Author name.
+        ai_clean (func): Optional function(raw pack text) -> cleaned text. Heuristic cleaning if None.
+        ai_signature (str): Identifies the AI settings, so changing them invalidates the cache.
+        chapter_size (int): Approximate characters per chapter file.
+        log_callback (func): Optional callback for status messages.
+        pack_chars (int): Target source characters per pack. Defaults to chapter_size.
+
+    Returns:
+        tuple: (rebuilt pack count, reused pack count)
+    """
+    lines = raw_text.splitlines()
+    repeating_headers = find_repeating_headers(count_header_neighbors(lines))
+    # Same paragraph mode merge_paragraphs(clean_structure(text)) would use
+    has_blank_lines = detect_blank_lines(iter_clean_lines(lines, repeating_headers))
+
+    mode = f"ai:{ai_signature}" if ai_clean else "heuristic"
+    book_key = _hash(str(MANIFEST_VERSION), mode, str(chapter_size), "\n".join(sorted(repeating_headers)),
+                     str(has_blank_lines))
+
+    cache_dir = sidecar_dir(output_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    source_chapters = split_source_chapters(lines, repeating_headers)
+    sources = ["\n".join(source_lines) for source_lines in source_chapters]
+    packs = pack_source_chapters(sources, [_hash(source) for source in sources], pack_chars or chapter_size)
+
+    chapters = []
+    toc = []
+    keys = []
+    rebuilt = 0
+    reused = 0
+
+    for index, pack in enumerate(packs):
+        is_first = index == 0
+        source = "\n".join(sources[i] for i in pack)
+        key = _hash(book_key, title if is_first else "", source)
+        keys.append(key)
+        entry_path = os.path.join(cache_dir, key + ".json")
+
+        entry = None
+        try:
+            with open(entry_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if entry is None:
+            cacheable = True
+            paragraphs = None
+            if ai_clean:
+                try:
+                    merged = ai_clean(source)
+                    paragraphs = merged.split("\n\n")
+                except ConversionCancelled:
+                    raise
+                except Exception as e:
+                    # Use the heuristic result this time but don't cache it, so the next run retries the AI.
+                    cacheable = False
+                    if log_callback:
+                        log_callback(f"AI Error in part {index + 1}: {e}; using standard cleaning for it.")
+            if paragraphs is None:
+                pack_lines = [line for i in pack for line in source_chapters[i]]
+                paragraphs = list(iter_merge_paragraphs(iter_clean_lines(pack_lines, repeating_headers),
+                                                        has_blank_lines))
+                merged = "\n\n".join(paragraphs)
+
+            # File names are local to the pack here; the pack's position is added when the book is assembled
+            builder = ChapterBuilder(title, chapter_size, file_prefix="", include_title=is_first)
+            rendered = [c for c in builder.iter_chapters(paragraphs) if c.body]
+            entry = {
+                "merged": merged,
+                "chapters": [{"file_name": c.file_name, "title": c.title, "body": c.body} for c in rendered],
+                "toc": _toc_to_json(builder.toc),
+            }
+            if cacheable:
+                _write_json_atomic(entry_path, entry)
+            rebuilt += 1
+        else:
+            reused += 1
+
+        # Identical packs (a repeated chapter) share a cache entry, so the
+        # file names have to come from the position, not the content.
+        prefix = f"part{index + 1:04d}_"
+        chapters.extend(Chapter(prefix + c["file_name"], c["title"], c["body"]) for c in entry["chapters"])
+        toc.extend(_toc_from_json(entry["toc"], prefix))
+
+    create_epub_from_chapters(chapters, toc, output_path, title, author)
+
+    _write_json_atomic(os.path.join(cache_dir, "manifest.json"), {
+        "version": MANIFEST_VERSION,
+        "book_key": book_key,
+        "title": title,
+        "parts": keys,
+    })
+
+    # Drop cached parts that are no longer part of the book
+    live = {key + ".json" for key in keys} | {"manifest.json"}
+    for name in os.listdir(cache_dir):
+        if name not in live and name.endswith(".json"):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+    if log_callback:
+        log_callback(f"Incremental build: {len(source_chapters)} chapter(s) in {len(packs)} part(s); "
+                     f"{rebuilt} part(s) rebuilt, {reused} reused.")
+    return rebuilt, reused
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class StageRecord:
+    """Measurements for one pipeline stage (or one AI chunk)."""
+
+    def __init__(self, name, input_size=None):
+        self.name = name
+        self.input_size = input_size
+        self.output_size = None
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_bytes = None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "wall_s": round(self.wall, 6),
+            "cpu_s": round(self.cpu, 6),
+            "peak_mb": None if self.peak_bytes is None else round(self.peak_bytes / (1024 * 1024), 3),
+            "input_chars": self.input_size,
+            "output_chars": self.output_size,
+        }
+
+
+class Tracer:
+    """
+    Records wall time, CPU time, peak memory and input/output sizes per stage.
+
+    CPU time is measured for the calling thread, so it stays meaningful when
+    the pipeline runs on a worker thread next to the GUI. Peak memory comes
+    from tracemalloc and is only collected with trace_memory=True, because
+    tracing slows the pipeline down noticeably. Safe to use from several
+    threads (AI chunks are recorded from the pool workers).
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, input_size=None):
+        """
+        Usage:
+            with tracer.stage("clean_structure", len(text)) as rec:
+                cleaned = clean_structure(text)
+                rec.output_size = len(cleaned)
+        """
+        record = StageRecord(name, input_size)
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        finally:
+            record.wall = time.perf_counter() - wall_start
+            record.cpu = time.thread_time() - cpu_start
+            if self.trace_memory:
+                record.peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - base)
+            with self.lock:
+                self.records.append(record)
+
+    def add(self, record):
+        with self.lock:
+            self.records.append(record)
+
+    def close(self):
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def summary_lines(self):
+        """Human-readable per-stage lines; AI chunks are aggregated into one line."""
+        lines = []
+        chunks = [r for r in self.records if r.name.startswith("ai_chunk")]
+        for r in self.records:
+            if r in chunks:
+                continue
+            line = f"  {r.name:<18} {r.wall:8.3f}s wall {r.cpu:8.3f}s cpu"
+            if r.peak_bytes is not None:
+                line += f" {r.peak_bytes / (1024 * 1024):8.1f} MB peak"
+            if r.input_size is not None:
+                output = "?" if r.output_size is None else f"{r.output_size:,}"
+                line += f"  {r.input_size:,} -> {output} chars"
+            lines.append(line)
+        if chunks:
+            walls = [r.wall for r in chunks]
+            lines.append(f"  ai_chunks          {len(chunks)} chunks, {sum(walls):.2f}s total, "
+                         f"{sum(walls) / len(walls):.2f}s mean, {max(walls):.2f}s max")
+        return lines
+
+    def to_dict(self):
+        with self.lock:
+            records = [r.to_dict() for r in self.records]
+        return {"total_wall_s": round(time.perf_counter() - self.started, 6), "stages": records}
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
+
+
+class ThroughputMeter:
+    """
+    Measures work done per second (e.g. AI chunks) and estimates time remaining.
+
+    Only time from start() to the last add() counts, so the rate carries
+    over from one file to the next without the gaps in between dragging it
+    down.
+    """
+
+    def __init__(self):
+        self.units = 0
+        self.seconds = 0.0
+        self._mark = None
+
+    def start(self):
+        self._mark = time.perf_counter()
+
+    def add(self, units):
+        now = time.perf_counter()
+        if self._mark is not None:
+            self.seconds += now - self._mark
+        self._mark = now
+        self.units += units
+
+    @property
+    def rate(self):
+        """Units per second, or None before anything was measured."""
+        if not self.units or self.seconds <= 0:
+            return None
+        return self.units / self.seconds
+
+    def eta(self, remaining):
+        """Estimated seconds for `remaining` more units, or None if unknown."""
+        rate = self.rate
+        return None if rate is None else remaining / rate
+
+
+def format_duration(seconds):
+    """Short human form: "45s", "3m 05s", "1h 12m"."""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
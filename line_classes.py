@@ -0,0 +1,52 @@
+import re
+
+# Common sentence terminators in English and Korean. A line ending in one of
+# these is never a heading.
+TERMINATORS = ('.', '!', '?', '"', '”', '’', "'", '。', '！', '？')
+
+# Common sentence terminators in English and Korean, used to end paragraphs in files without blank lines
+PARAGRAPH_TERMINATORS = ('.', '!', '?', '"', '”', '’', "'")
+
+# Regex for common chapter headers
+# 1. "Chapter N" or "Chapter N: Title"
+# 2. "1. Title"
+# 3. "제N장" (Korean)
+# 4. "N." (just number and dot)
+HEADER_PATTERN = re.compile(r'^(Chapter\s+\d+|^\d+\.\s+|제\s*\d+\s*장|^\d+$)', re.IGNORECASE)
+
+# Heading limits (see merger.is_short_heading and merger.is_heading_candidate)
+SHORT_HEADING_MAX_LENGTH = 20
+HEADING_CANDIDATE_MAX_LENGTH = 60
+HEADING_CANDIDATE_MAX_WORDS = 12
+
+# Flag bits returned by classify_line
+SHORT_HEADING = 1 # is_short_heading()
+HEADING_CANDIDATE = 2 # is_heading_candidate()
+CHAPTER_HEADING = 4 # A short heading that also matches HEADER_PATTERN
+
+
+def classify_line(clean):
+    """
+    Every heading predicate for one stripped line or paragraph, in one pass.
+
+    The length is checked first, so a normal-length paragraph is settled by
+    one len() and one endswith(); the word count and HEADER_PATTERN are only
+    looked at for lines short enough to need them.
+
+    Args:
+        clean (str): Stripped line or paragraph.
+
+    Returns:
+        int: SHORT_HEADING, HEADING_CANDIDATE and CHAPTER_HEADING bits (0 for body text and blank lines).
+    """
+    size = len(clean)
+    if not size:
+        return 0
+    if size > HEADING_CANDIDATE_MAX_LENGTH or clean.endswith(TERMINATORS):
+        return 0
+    flags = HEADING_CANDIDATE if len(clean.split()) <= HEADING_CANDIDATE_MAX_WORDS else 0
+    if size <= SHORT_HEADING_MAX_LENGTH:
+        flags |= SHORT_HEADING
+        if HEADER_PATTERN.match(clean):
+            flags |= CHAPTER_HEADING
+    return flags
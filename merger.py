@@ -1,11 +1,9 @@
+from itertools import chain, islice
+from line_classes import (HEADING_CANDIDATE_MAX_LENGTH, HEADING_CANDIDATE_MAX_WORDS, PARAGRAPH_TERMINATORS,
+                          SHORT_HEADING_MAX_LENGTH, TERMINATORS)
 
-import re
 
-
-TERMINATORS = ('.', '!', '?', '"', '”', '’', "'", '。', '！', '？')
-
-
-def is_short_heading(line, max_length=20):
+def is_short_heading(line, max_length=SHORT_HEADING_MAX_LENGTH):
     clean = line.strip()
     if not clean:
         return False
@@ -20,91 +18,137 @@ def is_heading_candidate(line):
     clean = line.strip()
     if not clean:
         return False
-    if len(clean) > 60:
+    if len(clean) > HEADING_CANDIDATE_MAX_LENGTH:
         return False
     if clean.endswith(TERMINATORS):
         return False
-    if len(clean.split()) > 12:
+    if len(clean.split()) > HEADING_CANDIDATE_MAX_WORDS:
         return False
     return True
 
-def merge_paragraphs(text):
+
+def closes_paragraph(stripped, has_blank_lines):
     """
-    Merges lines that are unnecessarily broken, while preserving actual paragraph structure
-    denoted by distinct blank lines.
-    
+    True if merge_stripped_lines holds no open paragraph after this line,
+    so the text can be cut right after it and both sides merged separately.
+
     Args:
-        text (str): Pre-cleaned text.
-        
+        stripped (str): A stripped line that survived cleaning.
+        has_blank_lines (bool): Paragraph mode, as decided for the whole book.
+
     Returns:
-        str: Text with paragraphs merged.
+        bool: The line is blank, a short heading, or (without blank lines) ends a sentence.
     """
-    lines = text.splitlines()
-    paragraphs = []
-    current_paragraph_lines = []
-    
+    return (not stripped or is_short_heading(stripped)
+            or (not has_blank_lines and stripped.endswith(PARAGRAPH_TERMINATORS)))
+
+
+def detect_blank_lines(cleaned_lines):
+    """
+    The paragraph mode merge_paragraphs(clean_structure(text)) ends up using:
+    True if any of the first 100 cleaned lines is blank.
+
+    clean_structure joins its lines with "\n" and merge_paragraphs splits them
+    again, which loses a final empty line, so when there are no more than 100
+    cleaned lines that last one is not counted.
+
+    Args:
+        cleaned_lines (iterable): Lines as iter_clean_lines yields them. Only the first 101 are read.
+
+    Returns:
+        bool: Whether blank lines separate paragraphs.
+    """
+    head = list(islice(cleaned_lines, 101))
+    if len(head) <= 100 and head and head[-1] == "":
+        head.pop()
+    return any(not line.strip() for line in head[:100])
+
+
+def iter_merge_paragraphs(lines, has_blank_lines=None):
+    """
+    Generator stage that merges hard-wrapped lines into paragraphs.
+
+    Only the first 100 lines are buffered (for the blank-line check), so this
+    can consume a line iterator of any size.
+
+    Args:
+        lines (iterable): Pre-cleaned lines.
+        has_blank_lines (bool): Paragraph mode override. Detected from the first 100 lines if None.
+
+    Yields:
+        str: One merged paragraph at a time.
+    """
+    lines = iter(lines)
+
     # Heuristic: Check if the file has blank lines.
     # If a file has frequent blank lines, we should respect them as paragraph separators.
     # If not, we rely on punctuation/indentation.
-    has_blank_lines = any(not line.strip() for line in lines[:100]) # Check first 100 lines
-    
-    for line in lines:
-        unique_line = line.strip()
-        
-        if not unique_line:
+    if has_blank_lines is None:
+        head = list(islice(lines, 100)) # Check first 100 lines
+        has_blank_lines = any(not line.strip() for line in head)
+        lines = chain(head, lines)
+
+    yield from merge_stripped_lines(map(str.strip, lines), has_blank_lines)
+
+
+def merge_stripped_lines(stripped_lines, has_blank_lines):
+    """
+    The merge loop shared by every cleaning engine.
+
+    Each line is stripped once by the caller and tested inline against the
+    same limits and terminators as is_short_heading (see line_classes), with
+    no per-line function calls.
+
+    Args:
+        stripped_lines (iterable): Stripped, already cleaned lines.
+        has_blank_lines (bool): Paragraph mode, as decided for the whole book.
+
+    Yields:
+        str: Merged paragraphs.
+    """
+    current_paragraph_lines = []
+    # Only in "no blank lines" mode does a terminated line end its paragraph
+    split_on_terminator = not has_blank_lines
+
+    for line in stripped_lines:
+        if not line:
             # Blank line detected. This is ALWAYS a paragraph break.
             if current_paragraph_lines:
-                paragraphs.append(" ".join(current_paragraph_lines))
+                yield " ".join(current_paragraph_lines)
                 current_paragraph_lines = []
             continue
-        
-        if is_short_heading(unique_line):
+
+        # is_short_heading(), inlined
+        if len(line) <= SHORT_HEADING_MAX_LENGTH and not line.endswith(TERMINATORS):
             if current_paragraph_lines:
-                paragraphs.append(" ".join(current_paragraph_lines))
+                yield " ".join(current_paragraph_lines)
                 current_paragraph_lines = []
-            paragraphs.append(unique_line)
+            yield line
             continue
 
-        # If we have current content, decide if we should merge or flush
-        if current_paragraph_lines:
-            last_line = current_paragraph_lines[-1]
-            
-            # Decision to flush (start new paragraph):
-            # 1. If we are in "no blank lines" mode, we look for punctuation.
-            # 2. If the new line starts with an indent (conceptually, though strip() removed it, 
-            #    we might need original line context? For now, assume strip() is okay but maybe we check punctuation).
-            
-            # Simple Punctuation Heuristic:
-            # If the PREVIOUS line ended with a sentence terminator (. ! ? " ”), 
-            # AND the current line starts with a Capital or Number or Quote,
-            # treat it as a new paragraph.
-            
-            # Common sentence terminators in English and Korean
-            terminators = ('.', '!', '?', '"', '”', '’', "'")
-            
-            is_terminated = last_line.endswith(terminators)
-            
-            # Special case: If the file DOES contain blank lines, we assume they are the primary separator.
-            # In that case, we ONLY merge (because non-blank lines are part of the same block).
-            # BUT, the user complained about "joining lines that are not breaks".
-            # This implies the user wants to join HARD WRAPS but keep PARAGRAPHS.
-            
-            if has_blank_lines:
-                # If the file uses blank lines for paragraphs, then adjacent lines are part of the same paragraph (hard wrap).
-                # So we continue merging.
-                pass
-            else:
-                # File has NO (or few) blank lines. Every line might be a paragraph OR a wrap.
-                # Heuristic: Break if valid terminator found.
-                if is_terminated:
-                    paragraphs.append(" ".join(current_paragraph_lines))
-                    current_paragraph_lines = []
-        
-        current_paragraph_lines.append(unique_line)
-            
+        # File has NO (or few) blank lines: every line might be a paragraph OR a wrap,
+        # so break after a sentence terminator. With blank lines, adjacent lines are hard wraps.
+        if current_paragraph_lines and split_on_terminator and current_paragraph_lines[-1].endswith(PARAGRAPH_TERMINATORS):
+            yield " ".join(current_paragraph_lines)
+            current_paragraph_lines = []
+
+        current_paragraph_lines.append(line)
+
     # Flush last paragraph
     if current_paragraph_lines:
-        paragraphs.append(" ".join(current_paragraph_lines))
+        yield " ".join(current_paragraph_lines)
+
+
+def merge_paragraphs(text):
+    """
+    Merges lines that are unnecessarily broken, while preserving actual paragraph structure
+    denoted by distinct blank lines.
+    
+    Args:
+        text (str): Pre-cleaned text.
         
+    Returns:
+        str: Text with paragraphs merged.
+    """
     # Join paragraphs with double newline to signify standard text format
-    return "\n\n".join(paragraphs)
+    return "\n\n".join(iter_merge_paragraphs(text.splitlines()))
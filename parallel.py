@@ -0,0 +1,202 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from cleaner import PAGE_NUM_PATTERN, count_header_neighbors, find_repeating_headers, is_dropped_line, iter_clean_lines
+from merger import closes_paragraph, detect_blank_lines
+from fused import iter_fused_paragraphs, merge_kept_lines
+
+# Below this size one process is faster than starting a pool
+MIN_PARALLEL_CHARS = 4 * 1024 * 1024
+
+# Segments per worker, so a slow segment does not leave the other workers idle
+SEGMENTS_PER_WORKER = 4
+
+# How far a segment boundary may move to land where the merger ends a paragraph anyway
+BOUNDARY_SEARCH_CHARS = 1024 * 1024
+
+# Block size for reading lines off the start of a segment
+LINE_BLOCK_CHARS = 64 * 1024
+
+
+def split_segments(text, count):
+    """
+    Cuts text into about count pieces, each ending right after a "\\n".
+
+    Cutting only there keeps text.splitlines() equal to the segments'
+    splitlines() concatenated ("\\r\\n" is never split).
+
+    Returns:
+        list: Segment strings, in order.
+    """
+    size = max(1, len(text) // count)
+    segments = []
+    start = 0
+    while start < len(text):
+        end = text.find("\n", start + size)
+        end = len(text) if end == -1 else end + 1
+        segments.append(text[start:end])
+        start = end
+    return segments
+
+
+def iter_segment_lines(segment):
+    """segment.splitlines(), a block at a time, so the whole segment is never split just to read its start."""
+    start = 0
+    while start < len(segment):
+        end = segment.find("\n", start + LINE_BLOCK_CHARS)
+        end = len(segment) if end == -1 else end + 1
+        yield from segment[start:end].splitlines()
+        start = end
+
+
+def _count_segment(segment):
+    # Map: neighbor counts within the segment, plus its first and last line
+    # so the reduce step can count the pairs that straddle two segments.
+    lines = segment.splitlines()
+    if not lines:
+        return {}, None, None
+    return count_header_neighbors(lines), lines[0], lines[-1]
+
+
+def _add_neighbor(neighbor_counts, line):
+    stripped = line.strip()
+    if stripped and len(stripped) < 100:
+        neighbor_counts[stripped] = neighbor_counts.get(stripped, 0) + 1
+
+
+def reduce_neighbor_counts(partials):
+    """
+    Merges per-segment count_header_neighbors results into the whole book's.
+
+    Args:
+        partials (list): (neighbor_counts, first line, last line) per segment, in order.
+
+    Returns:
+        dict: Exactly what count_header_neighbors returns for the whole text.
+    """
+    neighbor_counts = {}
+    previous_last = None
+    for counts, first, last in partials:
+        if first is None:
+            continue # Empty segment
+        for content, count in counts.items():
+            neighbor_counts[content] = neighbor_counts.get(content, 0) + count
+        if previous_last is not None:
+            # A page number on one side of the cut counts the line on the other side
+            if PAGE_NUM_PATTERN.match(previous_last):
+                _add_neighbor(neighbor_counts, first)
+            if PAGE_NUM_PATTERN.match(first):
+                _add_neighbor(neighbor_counts, previous_last)
+        previous_last = last
+    return neighbor_counts
+
+
+def find_safe_cut(text, start, repeating_headers, has_blank_lines):
+    """
+    First offset at or after start (right after a "\\n") where the merger
+    ends its paragraph anyway, so both sides can be merged separately.
+
+    Returns:
+        int: The offset, or None if there is none within BOUNDARY_SEARCH_CHARS.
+    """
+    limit = min(len(text), start + BOUNDARY_SEARCH_CHARS)
+    position = start
+    while position < limit:
+        end = text.find("\n", position)
+        if end == -1:
+            return None
+        end += 1
+        last_kept = None
+        # A "\n"-terminated piece can still hold several lines (e.g. "\r" or " " separators)
+        for line in text[position:end].splitlines():
+            stripped = line.strip()
+            if not is_dropped_line(line, stripped, repeating_headers):
+                last_kept = stripped
+        if last_kept is not None and closes_paragraph(last_kept, has_blank_lines):
+            return end
+        position = end
+    return None
+
+
+def _merge_segment(segment, repeating_headers, has_blank_lines):
+    # Reduce side: clean and merge one segment with the book-wide decisions
+    lines = segment.splitlines()
+    stripped = [line.strip() for line in lines]
+    kept = [i for i, line in enumerate(lines) if not is_dropped_line(line, stripped[i], repeating_headers)]
+    return list(merge_kept_lines(stripped, kept, has_blank_lines))
+
+
+def iter_parallel_paragraphs(text, workers=None, pool=None):
+    """
+    Cleans and merges one large text across a process pool.
+
+    Same paragraphs as fused.iter_fused_paragraphs(text.splitlines()) (and
+    so as merge_paragraphs(clean_structure(text))), in two rounds:
+
+    1. Map: the text is cut into segments at line breaks and each worker
+       counts page-number neighbors in its segment. The counts are summed,
+       with the pairs that straddle a cut added back, so repeating_headers
+       is decided exactly as in a single pass. The paragraph mode
+       (has_blank_lines) is decided once for the whole book as well.
+    2. The cuts are moved forward to the next line after which the merger
+       ends a paragraph anyway, and each worker cleans and merges its
+       segment with the book-wide decisions. Paragraphs come back in order.
+
+    Small texts, or a single worker, are handled in-process by the fused
+    engine. Periodic header detection needs the whole book at once and is
+    not supported here.
+
+    Args:
+        text (str): Raw text content.
+        workers (int): Pool size. Defaults to the CPU count.
+        pool (Executor): Optional pool to reuse instead of starting one.
+
+    Yields:
+        str: Merged paragraphs.
+    """
+    workers = workers or os.cpu_count() or 1
+    if pool is None and (workers < 2 or len(text) < MIN_PARALLEL_CHARS):
+        yield from iter_fused_paragraphs(text.splitlines())
+        return
+
+    if pool is None:
+        with ProcessPoolExecutor(max_workers=workers) as own_pool:
+            yield from iter_parallel_paragraphs(text, workers, own_pool)
+        return
+
+    segments = split_segments(text, workers * SEGMENTS_PER_WORKER)
+
+    # 1. Map/reduce the header statistics
+    neighbor_counts = reduce_neighbor_counts(pool.map(_count_segment, segments))
+    repeating_headers = find_repeating_headers(neighbor_counts)
+    # Segments are consecutive, so their lines chained are the book's lines; only the head is read
+    book_lines = chain.from_iterable(iter_segment_lines(segment) for segment in segments)
+    has_blank_lines = detect_blank_lines(iter_clean_lines(book_lines, repeating_headers))
+
+    # 2. Re-cut at paragraph ends, then clean and merge each piece
+    cuts = [0]
+    offset = 0
+    for segment in segments[:-1]:
+        offset += len(segment)
+        if offset <= cuts[-1]:
+            continue # The previous cut already moved past this one
+        cut = find_safe_cut(text, offset, repeating_headers, has_blank_lines)
+        if cut is not None and cut < len(text):
+            cuts.append(cut)
+    cuts.append(len(text))
+    pieces = [text[a:b] for a, b in zip(cuts, cuts[1:])]
+    del segments
+
+    count = len(pieces)
+    for paragraphs in pool.map(_merge_segment, pieces, [repeating_headers] * count, [has_blank_lines] * count):
+        yield from paragraphs
+
+
+def parallel_clean_and_merge(text, workers=None):
+    """
+    Drop-in replacement for merge_paragraphs(clean_structure(text)) that uses every core.
+
+    Returns:
+        str: Paragraphs separated by blank lines.
+    """
+    return "\n\n".join(iter_parallel_paragraphs(text, workers))
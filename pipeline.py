@@ -0,0 +1,149 @@
+import os
+from itertools import chain, islice
+import text_encoding
+from cleaner import count_header_neighbors, find_repeating_headers, iter_clean_lines
+from merger import detect_blank_lines, iter_merge_paragraphs
+from fused import fused_clean_and_merge, iter_fused_paragraphs
+from epub_writer import DEFAULT_COMPRESSION_LEVEL, DEFAULT_WRITER, create_epub, write_epub_streaming
+from incremental import convert_incremental
+from parallel import iter_parallel_paragraphs
+
+
+def read_text(input_path):
+    """
+    Reads an input text file, detecting its encoding first.
+
+    Args:
+        input_path (str): Path to the .txt file.
+
+    Returns:
+        str: File content.
+    """
+    return text_encoding.read_text(input_path)[0]
+
+
+def iter_file_lines(input_path, encoding_info=None):
+    """
+    Yields the lines of a text file one at a time.
+
+    Splitting each physical line again with splitlines() keeps the result
+    identical to read_text(path).splitlines(), including form feeds and other
+    Unicode line breaks.
+    """
+    with text_encoding.open_text(input_path, encoding_info) as f:
+        for raw_line in f:
+            yield from raw_line.splitlines()
+
+
+def convert_text(raw_text, periodic_headers=False):
+    """
+    Runs the heuristic cleaning pipeline (no AI).
+
+    Same result as merge_paragraphs(clean_structure(raw_text)), computed in
+    a single pass by the fused engine.
+
+    Args:
+        raw_text (str): Raw text content.
+        periodic_headers (bool): Also remove headers found by their period (see header_detector).
+
+    Returns:
+        str: Merged text ready for create_epub.
+    """
+    return fused_clean_and_merge(raw_text, periodic_headers)
+
+
+def default_output_path(input_path, output_dir=None):
+    output_path = os.path.splitext(input_path)[0] + ".epub"
+    if output_dir:
+        output_path = os.path.join(output_dir, os.path.basename(output_path))
+    return output_path
+
+
+def iter_streaming_paragraphs(input_path, encoding_info=None):
+    """
+    Cleaned, merged paragraphs of a text file, read from disk in two passes.
+
+    A first pass collects the header statistics for clean_structure, the
+    second streams lines through the cleaner and merger generators, so only
+    the first 101 cleaned lines are ever held at once.
+
+    Args:
+        input_path (str): Path to the text file.
+        encoding_info (EncodingInfo): Detected encoding. Detected here if None.
+
+    Yields:
+        str: Merged paragraphs, as merge_paragraphs(clean_structure(text)) would give them.
+    """
+    if encoding_info is None:
+        encoding_info = text_encoding.detect_encoding(input_path)
+    repeating_headers = find_repeating_headers(count_header_neighbors(iter_file_lines(input_path, encoding_info)))
+    cleaned_lines = iter_clean_lines(iter_file_lines(input_path, encoding_info), repeating_headers)
+    # Decide the paragraph mode from the head of the cleaned lines, then put the head back
+    head = list(islice(cleaned_lines, 101))
+    has_blank_lines = detect_blank_lines(head)
+    yield from iter_merge_paragraphs(chain(head, cleaned_lines), has_blank_lines)
+
+
+def convert_file_streaming(input_path, output_path, title, author, compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """
+    Converts a text file with bounded memory, however large it is.
+
+    The file is read twice from disk (see iter_streaming_paragraphs) and the
+    EPUB writer writes each chapter out as it is produced.
+
+    Returns:
+        EncodingInfo: The detected input encoding.
+    """
+    encoding_info = text_encoding.detect_encoding(input_path)
+    write_epub_streaming(iter_streaming_paragraphs(input_path, encoding_info), output_path, title, author,
+                         compression_level=compression_level)
+    return encoding_info
+
+
+def convert_file(input_path, output_path=None, title=None, author=None, streaming=False, incremental=False,
+                 periodic_headers=False, writer=DEFAULT_WRITER, compression_level=DEFAULT_COMPRESSION_LEVEL,
+                 cleaning_workers=None):
+    """
+    Converts a single text file to EPUB without any GUI.
+
+    Args:
+        input_path (str): Path to the .txt file.
+        output_path (str): Optional destination. Defaults to the input path with .epub.
+        title (str): Optional title. Defaults to the file name.
+        author (str): Optional author. Defaults to "Unknown".
+        streaming (bool): Use the bounded-memory streaming pipeline.
+        incremental (bool): Reuse unchanged chapters from the sidecar cache of a previous run.
+        periodic_headers (bool): Also remove headers found by their period, e.g. in books
+            without page numbers. Not supported by the streaming and incremental modes.
+        writer (str): EPUB writer, "ebooklib" or "native" (see epub_writer.WRITERS).
+            The streaming mode always uses the native writer, the incremental mode ebooklib.
+        compression_level (int): zlib level 0-9 for the native writer.
+        cleaning_workers (int): Clean this one file across that many processes (see parallel.py).
+            For very large files; ignored with periodic_headers.
+
+    Returns:
+        str: Path of the written EPUB.
+    """
+    if not output_path:
+        output_path = default_output_path(input_path)
+    if not title:
+        title = os.path.splitext(os.path.basename(input_path))[0] or "Untitled"
+    if not author:
+        author = "Unknown"
+
+    if streaming:
+        convert_file_streaming(input_path, output_path, title, author, compression_level)
+        return output_path
+
+    raw_text = read_text(input_path)
+    if incremental:
+        convert_incremental(raw_text, output_path, title, author)
+        return output_path
+
+    # Paragraphs go straight to the writer; no merged copy of the book is built.
+    if cleaning_workers and cleaning_workers > 1 and not periodic_headers:
+        paragraphs = iter_parallel_paragraphs(raw_text, cleaning_workers)
+    else:
+        paragraphs = iter_fused_paragraphs(raw_text.splitlines(), periodic_headers)
+    create_epub(paragraphs, output_path, title, author, writer=writer, compression_level=compression_level)
+    return output_path
@@ -0,0 +1,220 @@
+import codecs
+import io
+import mmap
+import os
+import re
+import time
+
+# Bytes sampled for detection, spread over the start, middle and end of the file
+SAMPLE_SIZE = 192 * 1024
+
+# First byte outside ASCII; every candidate codec encodes ASCII as itself
+NON_ASCII_PATTERN = re.compile(rb'[\x80-\xff]')
+
+# Non-ASCII characters of the decoded samples; only these say anything about the codec
+NON_ASCII_TEXT_PATTERN = re.compile(r'[^\x00-\x7f]')
+
+# A sample that is valid UTF-8 but for this many bad bytes (e.g. one stray
+# cp1252 dash) is still UTF-8, unless a CJK codec reads it as real text.
+UTF8_MAX_ERRORS = 8
+
+# Share of common characters a CJK codec must reach to beat nearly-valid UTF-8
+CJK_MIN_SCORE = 0.2
+
+# Bytes handed to the decoder at a time
+DECODE_CHUNK_SIZE = 1024 * 1024
+
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le", "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32-be", "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig", "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16-le", "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16-be", "utf-16"),
+)
+
+# Frequent syllables/characters per language. Real text in the right codec is
+# dominated by them; the same bytes decoded with the wrong CJK codec produce
+# valid but essentially random characters, which rarely hit these sets.
+COMMON_HANGUL = set(
+    "이다는의에가을를고하지서한로사기리도으게자들아니것수나어인대있그해요면시보주라만무부여정전구내거제일실"
+    "우상때까장말야와과님원성경동학생중소적했했던었았습니까요며고서도만큼처럼에서으로부터께서했다된다이다있다"
+    "없다같다보다알다오다가다주다모르다그래서하지만그리고그런데왜어디누구언제무엇어떻게집물길손눈발몸맘마음"
+)
+COMMON_HANZI = set(
+    "的一是不了人我在有他这中大来上国个到说们为子和你地出道也时年得就那要下以生会自着去之过家学对可她里后小么"
+    "心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长知民样现"
+)
+KANA_RANGE = (0x3040, 0x30FF)
+
+
+class EncodingInfo:
+    """Result of detect_encoding()."""
+
+    def __init__(self, encoding, codec, seconds, bom=False):
+        self.encoding = encoding # Name to report
+        self.codec = codec # Python codec to decode with
+        self.seconds = seconds
+        self.bom = bom
+
+    def __str__(self):
+        return f"{self.encoding}{' (BOM)' if self.bom else ''}"
+
+
+def _samples(data, sample_size):
+    """Head, middle and tail slices, each starting just after a newline byte."""
+    if len(data) <= sample_size:
+        return [data[:]]
+    part = sample_size // 3
+    samples = [data[:part]]
+    for start in (len(data) // 2, len(data) - part):
+        # 0x0A never occurs inside a multi-byte character in any of the
+        # candidate codecs, so this keeps the slices character-aligned.
+        newline = data.find(b"\n", start, start + part)
+        if newline != -1:
+            samples.append(data[newline + 1:start + part])
+    return samples
+
+
+def _decodes(samples, codec):
+    decoded = []
+    for sample in samples:
+        decoder = codecs.getincrementaldecoder(codec)(errors="strict")
+        try:
+            # final=False tolerates a character cut off at the end of the sample
+            decoded.append(decoder.decode(sample, final=False))
+        except UnicodeDecodeError:
+            return None
+    return "".join(decoded)
+
+
+def _utf8_errors(samples):
+    """Number of undecodable bytes in the samples, read as UTF-8."""
+    errors = 0
+    for sample in samples:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        errors += decoder.decode(sample, final=False).count("\ufffd")
+    return errors
+
+
+def _score(text, language, limit=40000):
+    # Scored on the first limit non-ASCII characters, wherever they are in the
+    # samples; an ASCII head must not push the CJK text out of the window.
+    non_ascii = NON_ASCII_TEXT_PATTERN.findall(text)[:limit]
+    if not non_ascii:
+        return 0.0
+    if language == "korean":
+        hits = sum(1 for c in non_ascii if c in COMMON_HANGUL)
+    elif language == "japanese":
+        hits = sum(1 for c in non_ascii if KANA_RANGE[0] <= ord(c) <= KANA_RANGE[1])
+    else:
+        hits = sum(1 for c in non_ascii if c in COMMON_HANZI)
+    return hits / len(non_ascii)
+
+
+def detect_encoding(path, sample_size=SAMPLE_SIZE):
+    """
+    Picks a codec for a text file from a memory-mapped sample.
+
+    Checks for UTF-8/16/32 byte order marks first, then accepts UTF-8 if the
+    sample is valid UTF-8 (a plain ASCII sample is extended from the first
+    non-ASCII byte in the file). Otherwise CP949/EUC-KR, Shift-JIS and
+    GB18030 are tried and ranked by how much of the decoded non-ASCII text
+    is made of common characters of their language (Korean wins ties). A
+    codec that reads none wins nothing, and a sample with only a few bytes
+    that are not UTF-8 stays UTF-8 unless a CJK codec reads it convincingly.
+
+    Args:
+        path (str): File to inspect.
+        sample_size (int): Bytes to sample.
+
+    Returns:
+        EncodingInfo
+    """
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return EncodingInfo("utf-8", "utf-8", time.perf_counter() - start)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            head = mm[:4]
+            for bom, name, codec in BOMS:
+                if head.startswith(bom):
+                    return EncodingInfo(name, codec, time.perf_counter() - start, bom=True)
+            samples = _samples(mm, sample_size)
+            if all(sample.isascii() for sample in samples):
+                # The samples say nothing about the codec. Sample from the first
+                # non-ASCII byte instead (e.g. Korean text a quarter into the file);
+                # everything before it is ASCII, so the slice starts on a character.
+                match = NON_ASCII_PATTERN.search(mm)
+                if match is None:
+                    return EncodingInfo("utf-8", "utf-8", time.perf_counter() - start) # Pure ASCII
+                samples.insert(0, mm[match.start():match.start() + sample_size // 3])
+
+    def done(name, codec):
+        return EncodingInfo(name, codec, time.perf_counter() - start)
+
+    utf8_errors = _utf8_errors(samples)
+    if not utf8_errors:
+        return done("utf-8", "utf-8")
+
+    best = None
+    for name, codec, language in (("cp949", "cp949", "korean"),
+                                  ("shift_jis", "cp932", "japanese"),
+                                  ("gb18030", "gb18030", "chinese")):
+        text = _decodes(samples, codec)
+        if text is None:
+            continue
+        score = _score(text, language)
+        # A codec that reads no common characters of its language at all is only decoding noise
+        if score > 0 and (best is None or score > best[0]):
+            best = (score, name, codec)
+
+    if best is None or (utf8_errors <= UTF8_MAX_ERRORS and best[0] < CJK_MIN_SCORE):
+        # Nothing reads as CJK text, or it is UTF-8 with a few bad bytes. UTF-8
+        # with replacement characters shows the damage instead of hiding it.
+        return done("utf-8", "utf-8")
+
+    _, name, codec = best
+    if name == "cp949" and _decodes(samples, "euc-kr") is not None:
+        # Plain EUC-KR; CP949 is a superset, so keep decoding with it.
+        name = "euc-kr"
+    return done(name, codec)
+
+
+def read_text(path, info=None):
+    """
+    Decodes a whole file in chunks straight from a memory map.
+
+    Newlines are translated like text-mode open() does, so the result is
+    interchangeable with f.read().
+
+    Args:
+        path (str): File to read.
+        info (EncodingInfo): Detection result; detected if None.
+
+    Returns:
+        tuple: (text, EncodingInfo)
+    """
+    if info is None:
+        info = detect_encoding(path)
+
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(info.codec)(errors="replace"), translate=True)
+    parts = []
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return "", info
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                for offset in range(0, len(mm), DECODE_CHUNK_SIZE):
+                    parts.append(decoder.decode(view[offset:offset + DECODE_CHUNK_SIZE]))
+            finally:
+                view.release()
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts), info
+
+
+def open_text(path, info=None):
+    """Opens a file for line-by-line reading in the detected encoding."""
+    if info is None:
+        info = detect_encoding(path)
+    return open(path, "r", encoding=info.codec, errors="replace")